@@ -0,0 +1,52 @@
+"""Time the conversion of a rendered PDF page into a Tk image at several zoom levels.
+
+Compares the old path (pix.samples -> Image.frombytes -> ImageTk.PhotoImage)
+with the PPM path the readers now use (pix.tobytes("ppm") -> tk.PhotoImage).
+Needs a display, since Tk images can only be created with a running Tk.
+
+    python benchmark_pixmap.py book.pdf --page 0 --zooms 0.5 1 2 4 --repeat 10
+"""
+import argparse
+import time
+import tkinter as tk
+import fitz
+from PIL import Image, ImageTk
+
+def samples_to_photo(pix):
+    return ImageTk.PhotoImage(Image.frombytes("RGB", [pix.width, pix.height], pix.samples))
+
+def ppm_to_photo(pix):
+    return tk.PhotoImage(data=pix.tobytes("ppm"), format="PPM")
+
+PATHS = {"samples -> PIL -> ImageTk": samples_to_photo, "ppm -> tk.PhotoImage": ppm_to_photo}
+
+def best_time(convert, pix, repeat):
+    """Fastest of ``repeat`` conversions, in ms"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        photo = convert(pix)
+        best = min(best, time.perf_counter() - start)
+        del photo
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf")
+    parser.add_argument("--page", type=int, default=0)
+    parser.add_argument("--zooms", type=float, nargs="+", default=[0.5, 1.0, 2.0, 4.0])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    root = tk.Tk()
+    root.withdraw()
+    with fitz.open(args.pdf) as document:
+        page = document[args.page]
+        print(f"{'zoom':>5} {'size':>11} {'MB':>6} " + " ".join(f"{name:>26}" for name in PATHS) + f" {'speedup':>8}")
+        for zoom in args.zooms:
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            times = [best_time(convert, pix, args.repeat) for convert in PATHS.values()]
+            print(f"{zoom:>5} {pix.width:>5}x{pix.height:<5} {len(pix.samples) / 2 ** 20:>6.1f} " + " ".join(f"{ms:>23.2f} ms" for ms in times) + f" {times[0] / times[1]:>7.2f}x")
+    root.destroy()
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,1171 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog, colorchooser
 import json
+import sys
+import argparse
 import re
 from pathlib import Path
 import PyPDF2
 from PIL import Image, ImageTk
 import fitz  
 import threading
+import time
 from datetime import datetime
 import pickle
+import sqlite3
 import os
+import hashlib
+import bisect
+import math
+import mmap
+from array import array
 import ctypes
 from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import customtkinter as ctk
+from readify_core import PageRenderCache, PageImage, TiledPageView, WriteBehindQueue, parse_page_ranges, export_pages, TextExtractionPool, run_chunks, page_chunks, worker_document
+
+def render_page(document, page_num, zoom):
+    """Rasterize one page of an open fitz document into a PageImage"""
+    pix = document[page_num].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    return PageImage.from_pixmap(pix)
+
+def render_page_file(file_path, page_num, zoom):
+    """render_page for a file path, run in a worker process that keeps the document open between pages"""
+    return render_page(worker_document(file_path), page_num, zoom)
+
+class PagePrefetcher:
+    """Renders the pages around the current one in a worker process.
+
+    PyMuPDF holds the GIL while it rasterizes, so a render on a thread would still stall Tk.
+    A coordinator thread hands ``executor`` one page at a time and posts each result back with
+    ``on_ready(prefetcher, key, image)``, where image is None if the page failed to render.
+    """
+    def __init__(self, root, file_path, page_count, cache, on_ready, executor, radius=2):
+        self.root = root
+        self.file_path = file_path
+        self.page_count = page_count
+        self.cache = cache
+        self.on_ready = on_ready
+        self.executor = executor
+        self.radius = radius
+        self.target = None
+        self.generation = 0
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    def request(self, page_num, zoom, theme, direction=1):
+        """Render page_num and its neighbours in the reading direction"""
+        self.request_pages(self.pages_to_render(page_num, direction, self.page_count), zoom, theme)
+    def request_pages(self, pages, zoom, theme):
+        """Replace the pending target; an in-flight batch for an older target is abandoned after its current page"""
+        with self.condition:
+            self.target = (list(pages), zoom, theme)
+            self.generation += 1
+            self.condition.notify()
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.generation += 1
+            self.condition.notify()
+    def pages_to_render(self, page_num, direction, total_pages):
+        """The requested page, the pages ahead in the reading direction, then a shorter run behind"""
+        ahead = [page_num + direction * i for i in range(self.radius + 1)]
+        behind = [page_num - direction * i for i in range(1, max(1, self.radius // 2) + 1)]
+        return [p for p in ahead + behind if 0 <= p < total_pages]
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.target is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                pages, zoom, theme = self.target
+                generation = self.generation
+                self.target = None
+            for p in pages:
+                if generation != self.generation:
+                    break
+                key = (p, round(zoom, 4), 0, theme)
+                if key in self.cache:
+                    continue
+                try:
+                    image = self.executor.submit(render_page_file, self.file_path, p, zoom).result()
+                except Exception as e:
+                    print(f"Error rendering page {p + 1}: {e}")
+                    image = None
+                self.root.after(0, self.on_ready, self, key, image)
+
+class ContinuousPageView:
+    """Lays every page out in one vertical column from its rect and attaches images only for pages near the viewport
+
+    ``lookup(page_num)`` returns a cached image or None; the pages it misses are passed to
+    ``request(pages)`` and stay placeholders until their image is handed to ``page_ready``.
+    """
+    def __init__(self, canvas, lookup, request, on_page_changed=None, gap=10, margin=300):
+        self.canvas = canvas
+        self.lookup = lookup
+        self.request = request
+        self.on_page_changed = on_page_changed
+        self.gap = gap
+        self.margin = margin
+        self.layout_key = None
+        self.rects_for = None
+        self.page_rects = []
+        self.tops = []
+        self.sizes = []
+        self.width = self.height = 0
+        self.pages = {}
+        self.pending = []
+        self.waiting = []
+        self.after_id = None
+        self.current_page = None
+    def load_rects(self, document, file_key):
+        if self.rects_for != file_key:
+            self.page_rects = [(page.rect.width, page.rect.height) for page in document]
+            self.rects_for = file_key
+    def zoom_limit(self, document, file_key, max_pixels=3000 * 3000):
+        """The largest zoom at which no page would need tiling"""
+        self.load_rects(document, file_key)
+        largest = max((width * height for width, height in self.page_rects), default=0)
+        return math.sqrt(max_pixels / largest) if largest else float('inf')
+    def layout(self, document, zoom, layout_key):
+        """Compute every page's position at ``zoom``; nothing is rendered until it scrolls into view"""
+        self.load_rects(document, layout_key[0])
+        self.clear()
+        self.layout_key = layout_key
+        self.sizes = [(round(width * zoom), round(height * zoom)) for width, height in self.page_rects]
+        self.tops = []
+        y = self.gap
+        for width, height in self.sizes:
+            self.tops.append(y)
+            y += height + self.gap
+        self.width = max((width for width, height in self.sizes), default=0) + 2 * self.gap
+        self.height = y
+        self.canvas.config(scrollregion=(0, 0, self.width, self.height))
+    def clear(self):
+        if self.after_id:
+            self.canvas.after_cancel(self.after_id)
+            self.after_id = None
+        self.canvas.delete("page")
+        self.pages.clear()
+        self.pending = []
+        self.waiting = []
+        self.layout_key = None
+        self.current_page = None
+    def page_origin(self, page_num):
+        return (self.width - self.sizes[page_num][0]) / 2, self.tops[page_num]
+    def page_at(self, y):
+        return min(max(bisect.bisect_right(self.tops, y) - 1, 0), len(self.tops) - 1)
+    def visible_pages(self):
+        """Pages within ``margin`` pixels of the viewport, those actually on screen first"""
+        top = self.canvas.canvasy(0)
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        on_screen = range(self.page_at(top), self.page_at(bottom) + 1)
+        nearby = range(self.page_at(top - self.margin), self.page_at(bottom + self.margin) + 1)
+        return list(on_screen) + [p for p in nearby if p not in on_screen]
+    def scroll_to_page(self, page_num):
+        self.canvas.yview_moveto((self.tops[page_num] - self.gap / 2) / self.height)
+        self.refresh()
+    def top_page(self):
+        """The page at the top of the viewport, or the last one on screen once scrolled to the end"""
+        if self.canvas.yview()[1] >= 1.0 and self.canvas.yview()[0] > 0:
+            return self.page_at(self.canvas.canvasy(self.canvas.winfo_height()))
+        return self.page_at(self.canvas.canvasy(0) + self.gap)
+    def refresh(self):
+        """Release pages that scrolled away and queue the ones that came into view"""
+        if self.layout_key is None or not self.tops:
+            return
+        wanted = self.visible_pages()
+        wanted_set = set(wanted)
+        for page_num in [p for p in self.pages if p not in wanted_set]:
+            self.canvas.delete(f"page{page_num}")
+            del self.pages[page_num]
+        for page_num in wanted:
+            if page_num not in self.pages:
+                x = (self.width - self.sizes[page_num][0]) / 2
+                self.canvas.create_rectangle(x, self.tops[page_num], x + self.sizes[page_num][0], self.tops[page_num] + self.sizes[page_num][1], fill='#ffffff', outline='#cccccc', tags=(f"page{page_num}", "page"))
+                self.pages[page_num] = None
+        self.pending = [p for p in wanted if self.pages[p] is None]
+        self.waiting = []
+        if self.pending and self.after_id is None:
+            self.after_id = self.canvas.after(1, self.render_pending)
+        page_num = self.top_page()
+        if page_num != self.current_page:
+            self.current_page = page_num
+            if self.on_page_changed:
+                self.on_page_changed(page_num)
+    def render_pending(self):
+        """Attach cached pages within a frame budget, then request the rest in viewport order"""
+        self.after_id = None
+        deadline = time.perf_counter() + 0.03
+        while self.pending and time.perf_counter() < deadline:
+            page_num = self.pending.pop(0)
+            image = self.lookup(page_num)
+            if image is None:
+                self.waiting.append(page_num)
+            else:
+                self.attach_page(page_num, image)
+        if self.pending:
+            self.after_id = self.canvas.after(1, self.render_pending)
+        elif self.waiting:
+            self.request(list(self.waiting))
+    def is_waiting(self, page_num):
+        return self.layout_key is not None and self.pages.get(page_num, True) is None
+    def page_ready(self, page_num, image):
+        """Swap a page's placeholder for its image if the page is still in view"""
+        if page_num in self.waiting:
+            self.waiting.remove(page_num)
+        self.attach_page(page_num, image)
+    def attach_page(self, page_num, image):
+        if self.pages.get(page_num, True) is not None:
+            return
+        photo = image.photo()
+        x = (self.width - photo.width()) / 2
+        self.canvas.create_image(x, self.tops[page_num], anchor="nw", image=photo, tags=(f"page{page_num}", "page"))
+        self.canvas.tag_raise("search_box")
+        self.pages[page_num] = photo
+
+SEARCH_INDEX_DIR = 'search_index'
+
+def file_fingerprint(file_path, sample_size=1024 * 1024):
+    """Fingerprint a file by its size and a hash of its first and last megabyte"""
+    size = os.path.getsize(file_path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(file_path, 'rb') as file:
+        digest.update(file.read(sample_size))
+        if size > sample_size:
+            file.seek(max(sample_size, size - sample_size))
+            digest.update(file.read(sample_size))
+    return digest.hexdigest()
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+class SearchIndex:
+    """On-disk inverted index mapping each term to the pages and word positions it occurs at"""
+    def __init__(self, postings, page_count, file_size, file_mtime):
+        self.postings = postings
+        self.page_count = page_count
+        self.file_size = file_size
+        self.file_mtime = file_mtime
+    @staticmethod
+    def index_path(file_path):
+        return os.path.join(SEARCH_INDEX_DIR, file_fingerprint(file_path) + '.pkl')
+    @classmethod
+    def build(cls, file_path, progress=None, pool=None):
+        stat = os.stat(file_path)
+        with fitz.open(file_path) as document:
+            page_count = len(document)
+        postings = {}
+        pool = pool or TextExtractionPool()
+        for done, (page_num, text, _) in enumerate(pool.iter_pages(file_path, range(page_count), with_words=False), start=1):
+            for position, term in enumerate(tokenize(text)):
+                postings.setdefault(term, {}).setdefault(page_num, []).append(position)
+            if progress:
+                progress(done, page_count)
+        return cls(postings, page_count, stat.st_size, stat.st_mtime)
+    @classmethod
+    def load(cls, file_path):
+        """Return the stored index for file_path, or None if it is missing or stale"""
+        index_path = cls.index_path(file_path)
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path, 'rb') as file:
+            data = pickle.load(file)
+        stat = os.stat(file_path)
+        if (data['file_size'], data['file_mtime']) != (stat.st_size, stat.st_mtime):
+            return None
+        return cls(data['postings'], data['page_count'], data['file_size'], data['file_mtime'])
+    def save(self, file_path):
+        os.makedirs(SEARCH_INDEX_DIR, exist_ok=True)
+        index_path = self.index_path(file_path)
+        data = {'postings': self.postings, 'page_count': self.page_count, 'file_size': self.file_size, 'file_mtime': self.file_mtime}
+        with open(index_path + '.tmp', 'wb') as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(index_path + '.tmp', index_path)
+    def candidate_pages(self, search_term, whole_word):
+        """Pages that can contain search_term, or None if the index cannot narrow the search"""
+        terms = tokenize(search_term)
+        if not terms:
+            return None
+        pages = None
+        for term in terms:
+            if whole_word:
+                term_pages = set(self.postings.get(term, {}))
+            else:
+                term_pages = set()
+                for indexed_term, indexed_pages in self.postings.items():
+                    if term in indexed_term:
+                        term_pages.update(indexed_pages)
+            pages = term_pages if pages is None else pages & term_pages
+            if not pages:
+                return []
+        return sorted(pages)
+
+def toc_children(toc):
+    """Map each outline entry's index, and -1 for the root, to the indices of its direct children"""
+    children = {-1: []}
+    stack = []
+    for index, (level, *_) in enumerate(toc):
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        children.setdefault(stack[-1][1] if stack else -1, []).append(index)
+        stack.append((level, index))
+    return children
+
+def load_toc(file_path):
+    """Read a PDF's outline with a private fitz handle, returning (toc, children index)"""
+    with fitz.open(file_path) as document:
+        toc = document.get_toc(simple=True)
+    return toc, toc_children(toc)
+
+THUMBNAIL_DIR = 'thumbnails'
+
+def render_thumbnail(document, page_num, width, height):
+    """Render a page scaled to fit a ``width`` x ``height`` box, as PNG bytes"""
+    page = document[page_num]
+    scale = min(width / max(page.rect.width, 1), height / max(page.rect.height, 1))
+    return page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False).tobytes("png")
+
+class ThumbnailCache:
+    """Page thumbnails on disk, one PNG per page under a directory named for the document fingerprint"""
+    def __init__(self, file_path, width=120):
+        self.width = width
+        self.height = int(width * 1.5)
+        self.directory = os.path.join(THUMBNAIL_DIR, f"{file_fingerprint(file_path)}-{width}")
+    def path(self, page_num):
+        return os.path.join(self.directory, f"{page_num}.png")
+    def __contains__(self, page_num):
+        return os.path.exists(self.path(page_num))
+    def missing(self, page_count):
+        if not os.path.isdir(self.directory):
+            return list(range(page_count))
+        present = set(os.listdir(self.directory))
+        return [p for p in range(page_count) if f"{p}.png" not in present]
+    def put(self, page_num, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(page_num)
+        with open(path + '.tmp', 'wb') as file:
+            file.write(data)
+        os.replace(path + '.tmp', path)
+
+class ThumbnailGenerator:
+    """Fills a ThumbnailCache on a worker thread, a batch of pages at a time, nearest the focused page first"""
+    def __init__(self, root, file_path, cache, on_batch, batch_size=16):
+        self.root = root
+        self.file_path = file_path
+        self.cache = cache
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.focus_page = 0
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    def focus(self, page_num):
+        """Generate the pages from ``page_num`` onwards next"""
+        self.focus_page = page_num
+    def cancel(self):
+        self.cancelled.set()
+    def next_batch(self, pending):
+        ordered = sorted(pending, key=lambda p: (p < self.focus_page, abs(p - self.focus_page)))
+        return ordered[:self.batch_size]
+    def run(self):
+        try:
+            with fitz.open(self.file_path) as document:
+                pending = set(self.cache.missing(len(document)))
+                while pending and not self.cancelled.is_set():
+                    batch = self.next_batch(pending)
+                    for page_num in batch:
+                        if self.cancelled.is_set():
+                            return
+                        self.cache.put(page_num, render_thumbnail(document, page_num, self.cache.width, self.cache.height))
+                    pending.difference_update(batch)
+                    self.root.after(0, self.on_batch, self, batch)
+        except Exception as e:
+            print(f"Error generating thumbnails: {e}")
+
+class ThumbnailStrip:
+    """A scrolling column of page thumbnails that only holds PhotoImages for the slots on screen"""
+    def __init__(self, parent, on_select, on_scroll=None, width=120, padding=8):
+        self.on_select = on_select
+        self.on_scroll = on_scroll
+        self.width = width
+        self.image_height = int(width * 1.5)
+        self.padding = padding
+        self.slot_height = self.image_height + 2 * padding + 16
+        self.canvas = tk.Canvas(parent, width=width + 2 * padding, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.canvas.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.config(yscrollcommand=lambda *args: (scrollbar.set(*args), self.refresh()))
+        self.canvas.bind("<Configure>", lambda event: self.refresh())
+        self.canvas.bind("<MouseWheel>", lambda event: self.canvas.yview_scroll(int(-event.delta / 120), "units"))
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.cache = None
+        self.page_count = 0
+        self.current_page = None
+        self.slots = {}
+    def load(self, cache, page_count):
+        self.clear()
+        self.cache = cache
+        self.page_count = page_count
+        self.canvas.config(scrollregion=(0, 0, self.width + 2 * self.padding, page_count * self.slot_height))
+        self.canvas.yview_moveto(0)
+        self.refresh()
+    def clear(self):
+        self.canvas.delete("all")
+        self.slots.clear()
+        self.cache = None
+        self.page_count = 0
+        self.current_page = None
+    def visible_pages(self):
+        if not self.page_count:
+            return range(0)
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(0, int(top // self.slot_height) - 1)
+        last = min(self.page_count, int(bottom // self.slot_height) + 2)
+        return range(first, last)
+    def refresh(self):
+        """Draw the slots in view and drop the canvas items and PhotoImages of those that scrolled away"""
+        visible = self.visible_pages()
+        for page_num in [p for p in self.slots if p not in visible]:
+            self.canvas.delete(f"slot{page_num}")
+            del self.slots[page_num]
+        for page_num in visible:
+            if page_num not in self.slots:
+                self.draw_slot(page_num)
+        if self.on_scroll and self.page_count:
+            self.on_scroll(visible.start)
+    def draw_slot(self, page_num):
+        tag = f"slot{page_num}"
+        self.canvas.delete(tag)
+        top = page_num * self.slot_height + self.padding
+        outline = '#FFD700' if page_num == self.current_page else '#cccccc'
+        self.canvas.create_rectangle(self.padding - 2, top - 2, self.padding + self.width + 2, top + self.image_height + 2, outline=outline, width=2, tags=tag)
+        self.canvas.create_text(self.padding + self.width / 2, top + self.image_height + 10, text=str(page_num + 1), tags=tag)
+        photo = None
+        if self.cache is not None and page_num in self.cache:
+            try:
+                photo = ImageTk.PhotoImage(Image.open(self.cache.path(page_num)))
+                self.canvas.create_image(self.padding + self.width / 2, top, image=photo, anchor=tk.N, tags=tag)
+            except Exception as e:
+                print(f"Error loading thumbnail: {e}")
+        self.slots[page_num] = photo
+    def pages_ready(self, pages):
+        visible = self.visible_pages()
+        for page_num in pages:
+            if page_num in visible:
+                self.draw_slot(page_num)
+    def set_current(self, page_num):
+        previous, self.current_page = self.current_page, page_num
+        for p in (previous, page_num):
+            if p is not None and p in self.slots:
+                self.draw_slot(p)
+        top = self.canvas.canvasy(0)
+        y = page_num * self.slot_height
+        if self.page_count and (y < top or y + self.slot_height > top + self.canvas.winfo_height()):
+            self.canvas.yview_moveto(y / (self.page_count * self.slot_height))
+    def on_click(self, event):
+        page_num = int(self.canvas.canvasy(event.y) // self.slot_height)
+        if 0 <= page_num < self.page_count:
+            self.on_select(page_num)
+
+def compile_search_pattern(search_term, case_sensitive=False, whole_word=False, regex=False):
+    """Build the regex used by every search mode; runs of whitespace in plain terms match any whitespace"""
+    pattern = search_term if regex else r'\s+'.join(re.escape(part) for part in search_term.split())
+    if whole_word:
+        pattern = r'\b(?:' + pattern + r')\b'
+    return re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+
+def word_char_boxes(page):
+    """{(block_no, line_no, word_no): [char bbox, ...]} for a page, numbered the way get_text("words") numbers its words"""
+    boxes = {}
+    for block in page.get_text("rawdict", flags=fitz.TEXTFLAGS_WORDS)["blocks"]:
+        for line_no, line in enumerate(block.get("lines", ())):
+            word_no = 0
+            current = []
+            for char in (char for span in line["spans"] for char in span["chars"]):
+                if char["c"].isspace():
+                    if current:
+                        boxes[(block["number"], line_no, word_no)] = current
+                        word_no += 1
+                        current = []
+                else:
+                    current.append(char["bbox"])
+            if current:
+                boxes[(block["number"], line_no, word_no)] = current
+    return boxes
+
+def iter_word_matches(words, pattern, page=None):
+    """Match pattern in one pass over a page's word boxes, yielding (match, rect) per hit; match.string is the joined words.
+
+    Hits covering whole words use the word boxes. A hit inside a word takes its extent from the
+    glyph boxes of ``page``, read once per page and only when needed; without a page it is
+    estimated from the word box.
+    """
+    char_boxes = None
+    starts = []
+    offset = 0
+    for word in words:
+        starts.append(offset)
+        offset += len(word[4]) + 1
+    text = ' '.join(word[4] for word in words)
+    for match in pattern.finditer(text):
+        if match.start() == match.end():
+            continue
+        first = bisect.bisect_right(starts, match.start()) - 1
+        last = bisect.bisect_right(starts, match.end() - 1) - 1
+        rect = None
+        for i in range(first, last + 1):
+            x0, y0, x1, y1, word = words[i][:5]
+            lo = max(match.start() - starts[i], 0)
+            hi = min(match.end() - starts[i], len(word))
+            if hi <= lo:
+                continue
+            if lo == 0 and hi == len(word):
+                part = fitz.Rect(x0, y0, x1, y1)
+            else:
+                if char_boxes is None and page is not None:
+                    char_boxes = word_char_boxes(page)
+                boxes = char_boxes.get(tuple(words[i][5:8])) if char_boxes else None
+                if boxes and len(boxes) == len(word):
+                    part = fitz.Rect(boxes[lo][0], y0, boxes[hi - 1][2], y1)
+                else:
+                    char_width = (x1 - x0) / len(word)
+                    part = fitz.Rect(x0 + lo * char_width, y0, x0 + hi * char_width, y1)
+            rect = part if rect is None else rect | part
+        if rect is not None:
+            yield match, rect
+
+def search_words(words, page_num, pattern, page=None):
+    """Return an exact (page_num, rect) per hit of pattern among a page's word boxes"""
+    return [(page_num, rect) for match, rect in iter_word_matches(words, pattern, page)]
+
+def search_page(page, page_num, pattern):
+    """Return the (page_num, rect) hits for pattern on one page"""
+    return search_words(page.get_text("words"), page_num, pattern, page)
+
+def search_pages(file_path, page_numbers, pattern):
+    """Return the (page_num, rect) hits for pattern on a run of pages using a private fitz handle; runs in a worker process"""
+    hits = []
+    with fitz.open(file_path) as document:
+        for page_num in page_numbers:
+            hits.extend(search_page(document[page_num], page_num, pattern))
+    return hits
+
+class SearchWorker:
+    """Scans PDF pages for a query in worker processes, streaming hits back to the Tk thread in page order and in batches"""
+    def __init__(self, root, file_path, pages, pattern, on_batch, on_done, batch_interval=0.1, max_workers=None, chunk_size=8):
+        self.root = root
+        self.file_path = file_path
+        self.pages = list(pages)
+        self.pattern = pattern
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.batch_interval = batch_interval
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    def cancel(self):
+        self.cancelled.set()
+    def run(self):
+        try:
+            chunks = [self.pages[i:i + self.chunk_size] for i in range(0, len(self.pages), self.chunk_size)]
+            batch = []
+            have_hits = False
+            done = 0
+            last_flush = time.perf_counter()
+            for chunk, hits in run_chunks(search_pages, self.file_path, chunks, (self.pattern,), self.max_workers, self.cancelled):
+                done += len(chunk)
+                batch.extend(hits)
+                if (batch and not have_hits) or time.perf_counter() - last_flush >= self.batch_interval:
+                    have_hits = have_hits or bool(batch)
+                    self.root.after(0, self.deliver, batch, done)
+                    batch = []
+                    last_flush = time.perf_counter()
+            if self.cancelled.is_set():
+                return
+            self.root.after(0, self.deliver, batch, len(self.pages))
+        except Exception as e:
+            print(f"Error searching PDF: {e}")
+        self.root.after(0, self.finish)
+    def deliver(self, hits, pages_done):
+        if not self.cancelled.is_set():
+            self.on_batch(self, hits, pages_done, len(self.pages))
+    def finish(self):
+        if not self.cancelled.is_set():
+            self.on_done(self)
+
+class LineIndexedFile:
+    """Read-only, memory-mapped text file with an index of line start byte offsets"""
+    def __init__(self, file_path, encoding='utf-8'):
+        self.file_path = file_path
+        self.encoding = encoding
+        self.file = open(file_path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self.line_starts = array('Q', [0])
+        self.line_starts.extend(match.end() for match in re.finditer(b'\n', self.data))
+        if len(self.line_starts) > 1 and self.line_starts[-1] == self.size:
+            self.line_starts.pop()
+    @property
+    def line_count(self):
+        return len(self.line_starts)
+    def line_start(self, line):
+        return self.line_starts[line] if line < len(self.line_starts) else self.size
+    def decode(self, start, end):
+        return self.data[start:end].decode(self.encoding, errors='replace')
+    def read_lines(self, first, last):
+        return self.decode(self.line_start(first), self.line_start(last)).replace('\r\n', '\n')
+    def line_of(self, offset):
+        return bisect.bisect_right(self.line_starts, offset) - 1
+    def line_col(self, offset):
+        """Map an absolute byte offset to a (line, column in characters) pair"""
+        line = self.line_of(offset)
+        return line, len(self.decode(self.line_start(line), offset))
+    def offset_of(self, line, col):
+        line = min(max(line, 0), self.line_count - 1)
+        text = self.decode(self.line_start(line), self.line_start(line + 1))
+        return self.line_start(line) + len(text[:col].encode(self.encoding))
+    def close(self):
+        if self.size:
+            self.data.close()
+        self.file.close()
+
+class TextSearchEngine:
+    """Regex search straight over a LineIndexedFile's memory map, yielding absolute (start, end) byte offsets.
+
+    Plain ASCII terms in UTF-8 files are matched as a bytes regex on the map itself;
+    everything else is decoded in chunks that overlap so matches across chunk edges are kept.
+    """
+    def __init__(self, source, chunk_size=8 * 1024 * 1024, overlap=64 * 1024, context=256):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.context = context
+    def search(self, search_term, case_sensitive=False, whole_word=False, regex=False):
+        if not regex and search_term.isascii() and self.source.encoding.replace('-', '').lower() == 'utf8':
+            return self.search_bytes(search_term, case_sensitive, whole_word)
+        return self.search_decoded(compile_search_pattern(search_term, case_sensitive, whole_word, regex))
+    def search_bytes(self, search_term, case_sensitive, whole_word):
+        pattern = rb'\s+'.join(re.escape(part.encode('ascii')) for part in search_term.split())
+        if not pattern or not self.source.size:
+            return
+        for match in re.compile(pattern, 0 if case_sensitive else re.IGNORECASE).finditer(self.source.data):
+            start, end = match.span()
+            if whole_word and not self.is_whole_word(start, end):
+                continue
+            yield start, end
+    def search_decoded(self, pattern):
+        """Scan chunk by chunk, resuming each chunk where the last yielded match ended so the
+        matches are the same non-overlapping ones a single scan of the whole text would find"""
+        size = self.source.size
+        chunk_start = resume = 0
+        while chunk_start < size:
+            chunk_end = self.char_boundary(min(size, chunk_start + self.chunk_size))
+            window_start = self.char_boundary(max(0, chunk_start - self.context))
+            window_end = self.char_boundary(min(size, chunk_end + self.overlap))
+            byte_position = min(max(resume, window_start), window_end)
+            text = self.source.decode(window_start, window_end)
+            position = len(self.source.decode(window_start, byte_position))
+            for match in pattern.finditer(text, position):
+                byte_position += len(text[position:match.start()].encode(self.source.encoding))
+                start = byte_position
+                byte_position += len(match.group().encode(self.source.encoding))
+                position = match.end()
+                if start >= chunk_end:
+                    break
+                if start >= chunk_start and start != byte_position:
+                    resume = byte_position
+                    yield start, byte_position
+            chunk_start = chunk_end
+    def char_boundary(self, offset):
+        """Move offset forward past UTF-8 continuation bytes"""
+        data = self.source.data
+        while offset < self.source.size and 0x80 <= data[offset] < 0xC0:
+            offset += 1
+        return offset
+    def is_whole_word(self, start, end):
+        """Apply the same boundary rule as \\b to an ASCII bytes match, looking at the characters around it"""
+        data = self.source.data
+        is_word = lambda char: bool(char) and (char.isalnum() or char == '_')
+        if start == 0:
+            before = ''
+        elif data[start - 1] < 0x80:
+            before = chr(data[start - 1])
+        else:
+            before_start = start - 1
+            while before_start > 0 and start - before_start < 4 and 0x80 <= data[before_start] < 0xC0:
+                before_start -= 1
+            before = self.source.decode(before_start, start)[-1:]
+        if end >= self.source.size:
+            after = ''
+        elif data[end] < 0x80:
+            after = chr(data[end])
+        else:
+            after = self.source.decode(end, min(self.source.size, end + 4))[:1]
+        return is_word(before) != is_word(chr(data[start])) and is_word(chr(data[end - 1])) != is_word(after)
+
+class VirtualTextView:
+    """Keeps only a window of lines from a LineIndexedFile in a tk.Text and refills it as the view moves"""
+    def __init__(self, text_widget, scrollbar, window_lines=2000, on_view_changed=None):
+        self.text = text_widget
+        self.scrollbar = scrollbar
+        self.window_lines = window_lines
+        self.on_view_changed = on_view_changed
+        self.source = None
+        self.first_line = 0
+        self.last_line = 0
+        self.loading = False
+    def attach(self, source):
+        self.detach()
+        self.source = source
+        self.text.config(yscrollcommand=self.on_text_scroll)
+        self.scrollbar.config(command=self.on_scrollbar)
+        self.load_window(0)
+    def detach(self):
+        if self.source:
+            self.source.close()
+            self.source = None
+        self.text.config(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.config(command=self.text.yview)
+    def load_window(self, first_line):
+        total = self.source.line_count
+        first = min(max(first_line, 0), max(0, total - self.window_lines))
+        last = min(total, first + self.window_lines)
+        self.loading = True
+        try:
+            self.text.delete('1.0', tk.END)
+            self.text.insert('1.0', self.source.read_lines(first, last))
+        finally:
+            self.loading = False
+        self.first_line, self.last_line = first, last
+        if self.on_view_changed:
+            self.on_view_changed()
+    def window_offsets(self):
+        return self.source.line_start(self.first_line), self.source.line_start(self.last_line)
+    def visible_offsets(self, margin_lines=0):
+        """Byte range of the lines on screen plus margin_lines either side, clamped to the loaded window"""
+        top = int(self.text.index('@0,0').split('.')[0]) - 1 - margin_lines
+        bottom = int(self.text.index(f'@0,{self.text.winfo_height()}').split('.')[0]) + margin_lines
+        first = self.first_line + max(0, top)
+        last = min(self.last_line, self.first_line + bottom)
+        return self.source.line_start(first), self.source.line_start(last)
+    def show_line(self, line):
+        """Make sure the absolute line is loaded, recentring the window on it if needed"""
+        margin = self.window_lines // 4
+        total = self.source.line_count
+        near_start = line - self.first_line < margin and self.first_line > 0
+        near_end = self.last_line - line < margin and self.last_line < total
+        if not self.first_line <= line < self.last_line or near_start or near_end:
+            self.load_window(line - self.window_lines // 2)
+    def scroll_to_line(self, line):
+        self.show_line(line)
+        self.text.yview(f"{line - self.first_line + 1}.0")
+    def on_text_scroll(self, top, bottom):
+        if self.loading or not self.source:
+            return
+        span = max(1, self.last_line - self.first_line)
+        total = max(1, self.source.line_count)
+        top_line = self.first_line + float(top) * span
+        bottom_line = self.first_line + float(bottom) * span
+        self.scrollbar.set(top_line / total, bottom_line / total)
+        margin = self.window_lines // 4
+        if (top_line - self.first_line < margin and self.first_line > 0) or (self.last_line - bottom_line < margin and self.last_line < total):
+            self.scroll_to_line(int(top_line))
+        elif self.on_view_changed:
+            self.on_view_changed()
+    def on_scrollbar(self, *args):
+        if args[0] == 'moveto':
+            self.scroll_to_line(int(float(args[1]) * self.source.line_count))
+        else:
+            self.text.yview(*args)
+    def index_for_offset(self, offset):
+        """Tk index for an absolute byte offset, loading the surrounding lines if necessary"""
+        self.show_line(self.source.line_of(offset))
+        return self.window_index(offset)
+    def window_index(self, offset):
+        """Tk index for a byte offset inside the loaded window, without moving it"""
+        line, col = self.source.line_col(offset)
+        return f"{line - self.first_line + 1}.{col}"
+    def index_for_position(self, position):
+        """Tk index for a stored position: a byte offset, or an absolute "line.col" string"""
+        if isinstance(position, str):
+            line, col = map(int, position.split('.'))
+            position = self.source.offset_of(line - 1, col)
+        return self.index_for_offset(position)
+    def offset_for_index(self, index):
+        line, col = map(int, self.text.index(index).split('.'))
+        return self.source.offset_of(self.first_line + line - 1, col)
+
+def snippet(text, start, end, context=40):
+    """A single-line excerpt of text around [start, end)"""
+    prefix = '…' if start > context else ''
+    suffix = '…' if end + context < len(text) else ''
+    return prefix + ' '.join(text[max(0, start - context):end + context].split()) + suffix
+
+def search_document(file_path, search_term, case_sensitive=False, whole_word=False, regex=False, max_hits=500):
+    """Search one PDF or text file, returning (file_path, match_count, hits) with at most max_hits hits.
+
+    Each hit is (position, label, snippet); position has the shape EbookReader.search_results uses,
+    (page_num, rect) for PDFs and (start, end) byte offsets for text. PDFs with a current
+    SearchIndex only scan the candidate pages.
+    """
+    pattern = compile_search_pattern(search_term, case_sensitive, whole_word, regex)
+    hits = []
+    count = 0
+    if file_path.lower().endswith('.pdf'):
+        index = None if regex else SearchIndex.load(file_path)
+        candidates = index.candidate_pages(search_term, whole_word) if index else None
+        with fitz.open(file_path) as document:
+            for page_num in range(len(document)) if candidates is None else candidates:
+                page = document[page_num]
+                for match, rect in iter_word_matches(page.get_text("words"), pattern, page):
+                    count += 1
+                    if len(hits) < max_hits:
+                        hits.append(((page_num, tuple(rect)), f"p. {page_num + 1}", snippet(match.string, match.start(), match.end())))
+        return file_path, count, hits
+    source = LineIndexedFile(file_path)
+    try:
+        for start, end in TextSearchEngine(source).search(search_term, case_sensitive, whole_word, regex):
+            count += 1
+            if len(hits) < max_hits:
+                line = source.line_of(start)
+                first = max(source.line_start(line), start - 60)
+                last = min(source.line_start(line + 1), end + 60)
+                excerpt = ' '.join(source.decode(first, last).split())
+                hits.append(((start, end), f"line {line + 1}", ('…' if first > source.line_start(line) else '') + excerpt))
+    finally:
+        source.close()
+    return file_path, count, hits
+
+class LibrarySearch:
+    """Searches many files in worker processes, one file per task, streaming results with matches back to the Tk thread"""
+    def __init__(self, root, files, query, on_batch, on_done, max_workers=None, batch_interval=0.1):
+        self.root = root
+        self.files = list(files)
+        self.query = query
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.max_workers = max_workers
+        self.batch_interval = batch_interval
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    def cancel(self):
+        self.cancelled.set()
+    def run(self):
+        batch = []
+        done = 0
+        last_flush = time.perf_counter()
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(search_document, file_path, *self.query) for file_path in self.files]
+                try:
+                    for future in as_completed(futures):
+                        if self.cancelled.is_set():
+                            return
+                        done += 1
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"Error searching library file: {e}")
+                            continue
+                        if result[1]:
+                            batch.append(result)
+                        if time.perf_counter() - last_flush >= self.batch_interval:
+                            self.root.after(0, self.deliver, batch, done)
+                            batch = []
+                            last_flush = time.perf_counter()
+                finally:
+                    for future in futures:
+                        future.cancel()
+            self.root.after(0, self.deliver, batch, done)
+        except Exception as e:
+            print(f"Error searching library: {e}")
+        self.root.after(0, self.finish)
+    def deliver(self, results, files_done):
+        if not self.cancelled.is_set():
+            self.on_batch(results, files_done, len(self.files))
+    def finish(self):
+        if not self.cancelled.is_set():
+            self.on_done()
+
+LIBRARY_EXTENSIONS = ('.pdf', '.txt')
+
+def catalog_entry(file_path, max_text_chars=2_000_000):
+    """Fingerprint one file and extract its page count, title, TOC and text (capped); runs in a worker process.
+
+    A file that cannot be parsed is still returned, with an 'error', so it is not retried until it changes.
+    """
+    stat = os.stat(file_path)
+    entry = {'path': file_path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'fingerprint': file_fingerprint(file_path),
+             'page_count': None, 'title': Path(file_path).stem, 'toc': [], 'text': '', 'error': None}
+    try:
+        extract_catalog_text(file_path, entry, max_text_chars)
+    except Exception as e:
+        entry['error'] = str(e)
+    return entry
+
+def extract_catalog_text(file_path, entry, max_text_chars):
+    if file_path.lower().endswith('.pdf'):
+        with fitz.open(file_path) as document:
+            entry['page_count'] = len(document)
+            entry['title'] = (document.metadata or {}).get('title') or entry['title']
+            entry['toc'] = document.get_toc(simple=True)
+            parts, length = [], 0
+            for page in document:
+                if length >= max_text_chars:
+                    break
+                text = page.get_text()
+                parts.append(text)
+                length += len(text)
+            entry['text'] = '\f'.join(parts)[:max_text_chars]
+    else:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            entry['text'] = file.read(max_text_chars)
+
+class LibraryCatalog:
+    """SQLite catalog of scanned files: fingerprint, page count, title and TOC, with extracted text in a side table"""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, fingerprint TEXT NOT NULL,
+                                          page_count INTEGER, title TEXT, toc TEXT, scanned_at TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS texts (path TEXT PRIMARY KEY, text TEXT NOT NULL);
+    """
+    def __init__(self, db_path='library_catalog.db'):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(self.SCHEMA)
+    def known_files(self):
+        """{path: (size, mtime, fingerprint)} for everything in the catalog"""
+        return {path: (size, mtime, fingerprint) for path, size, mtime, fingerprint in self.connection.execute('SELECT path, size, mtime, fingerprint FROM files')}
+    def add(self, entries):
+        scanned_at = datetime.now().isoformat(timespec='seconds')
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [(e['path'], e['size'], e['mtime'], e['fingerprint'], e['page_count'], e['title'], json.dumps(e['toc']), scanned_at) for e in entries])
+            self.connection.executemany('INSERT OR REPLACE INTO texts VALUES (?, ?)', [(e['path'], e['text']) for e in entries])
+    def touch(self, entries):
+        """Record a new size/mtime for files whose content fingerprint did not change"""
+        with self.connection:
+            self.connection.executemany('UPDATE files SET size = ?, mtime = ? WHERE path = ?', [(e['size'], e['mtime'], e['path']) for e in entries])
+    def remove(self, paths):
+        with self.connection:
+            self.connection.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in paths])
+            self.connection.executemany('DELETE FROM texts WHERE path = ?', [(path,) for path in paths])
+    def summary(self):
+        files, pages = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(page_count), 0) FROM files').fetchone()
+        return {'files': files, 'pages': pages}
+    def close(self):
+        self.connection.close()
+
+class LibraryScanner:
+    """Incrementally syncs a LibraryCatalog with the PDF/TXT files under some directories.
+
+    Files whose size and mtime match the catalog are skipped without being read; the rest are
+    fingerprinted and extracted in a process pool, with a bounded number of tasks in flight so a
+    large share never queues everything at once. Catalogued files that disappeared are pruned, except
+    after a cancelled scan or under a directory that could not be read.
+    """
+    def __init__(self, directories, db_path='library_catalog.db', max_workers=None, progress=None, cancelled=None, batch_size=200):
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.db_path = db_path
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.progress = progress
+        self.cancelled = cancelled or threading.Event()
+        self.batch_size = batch_size
+    def walk(self):
+        """({path: (size, mtime)} for every supported file under the directories, [paths that could not be read])"""
+        found = {}
+        unreadable = []
+        pending = list(self.directories)
+        while pending and not self.cancelled.is_set():
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending.append(entry.path)
+                            elif entry.name.lower().endswith(LIBRARY_EXTENSIONS):
+                                stat = entry.stat()
+                                found[entry.path] = (stat.st_size, stat.st_mtime)
+                        except OSError:
+                            unreadable.append(entry.path)
+            except OSError as e:
+                print(f"Error scanning directory: {e}")
+                unreadable.append(directory)
+        return found, unreadable
+    @staticmethod
+    def is_under(path, directories):
+        return any(path == directory or path.startswith(directory.rstrip(os.sep) + os.sep) for directory in directories)
+    def in_scope(self, path):
+        return self.is_under(path, self.directories)
+    def scan(self):
+        """Bring the catalog up to date and return counts and timings"""
+        start = time.perf_counter()
+        catalog = LibraryCatalog(self.db_path)
+        try:
+            found, unreadable = self.walk()
+            walked = time.perf_counter()
+            known = {path: state for path, state in catalog.known_files().items() if self.in_scope(path)}
+            # A cancelled walk is partial, and files under an unreadable directory may still exist
+            removed = [] if self.cancelled.is_set() else [path for path in known if path not in found and not self.is_under(path, unreadable)]
+            catalog.remove(removed)
+            changed = [path for path, state in found.items() if known.get(path, (None, None))[:2] != state]
+            stats = {'files': len(found), 'unchanged': len(found) - len(changed), 'added': 0, 'updated': 0, 'touched': 0,
+                     'removed': len(removed), 'errors': 0, 'bytes': 0}
+            added, touched = [], []
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                paths = iter(changed)
+                in_flight = set()
+                done = 0
+                while not self.cancelled.is_set():
+                    while len(in_flight) < self.max_workers * 4:
+                        path = next(paths, None)
+                        if path is None:
+                            break
+                        in_flight.add(executor.submit(catalog_entry, path))
+                    if not in_flight:
+                        break
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done += 1
+                        try:
+                            entry = future.result()
+                        except Exception as e:
+                            print(f"Error cataloguing file: {e}")
+                            stats['errors'] += 1
+                            continue
+                        stats['bytes'] += entry['size']
+                        if entry['error']:
+                            print(f"Error cataloguing {entry['path']}: {entry['error']}")
+                            stats['errors'] += 1
+                        previous = known.get(entry['path'])
+                        if previous and previous[2] == entry['fingerprint']:
+                            touched.append(entry)
+                            stats['touched'] += 1
+                        else:
+                            added.append(entry)
+                            stats['updated' if previous else 'added'] += 1
+                    if len(added) >= self.batch_size:
+                        catalog.add(added)
+                        added = []
+                    if len(touched) >= self.batch_size:
+                        catalog.touch(touched)
+                        touched = []
+                    if self.progress:
+                        self.progress(done, len(changed))
+                for future in in_flight:
+                    future.cancel()
+            catalog.add(added)
+            catalog.touch(touched)
+        finally:
+            catalog.close()
+        finished = time.perf_counter()
+        stats.update(cancelled=self.cancelled.is_set(), walk_s=walked - start, extract_s=finished - walked, total_s=finished - start,
+                     files_per_s=len(found) / max(finished - start, 1e-9), extracted_per_s=len(changed) / max(finished - walked, 1e-9))
+        return stats
+
+def format_scan_stats(stats):
+    return (f"{stats['files']} files: {stats['added']} added, {stats['updated']} updated, {stats['touched']} touched, "
+            f"{stats['unchanged']} unchanged, {stats['removed']} removed, {stats['errors']} errors\n"
+            f"walk {stats['walk_s']:.1f}s, extract {stats['extract_s']:.1f}s ({stats['extracted_per_s']:.1f} files/s, "
+            f"{stats['bytes'] / 2 ** 20 / max(stats['extract_s'], 1e-9):.1f} MB/s), total {stats['total_s']:.1f}s ({stats['files_per_s']:.0f} files/s)")
+
+class ReaderStore:
+    """SQLite (WAL) store for bookmarks, notes, reading history and preferences, written one record at a time"""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS bookmarks (name TEXT PRIMARY KEY, file_path TEXT NOT NULL, position TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS bookmarks_file_path ON bookmarks (file_path);
+        CREATE TABLE IF NOT EXISTS annotations (name TEXT PRIMARY KEY, content TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS reading_history (file_path TEXT PRIMARY KEY, last_opened TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS reading_positions (file_path TEXT PRIMARY KEY, position INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS preferences (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    """
+    def __init__(self, db_path='ebook_reader_data.db'):
+        self.db_path = db_path
+        # Writes arrive from the WriteBehindQueue thread; the lock serialises them with reads on the UI thread
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(self.SCHEMA)
+    def migrate(self, pickle_path='ebook_reader_data.pkl', bookmarks_path='bookmarks.json'):
+        """Import the legacy pickle and bookmarks.json once; the old files are left in place"""
+        if self.connection.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone():
+            return
+        with self.transaction():
+            if os.path.exists(pickle_path):
+                with open(pickle_path, 'rb') as file:
+                    data = pickle.load(file)
+                self.write_all(data.get('bookmarks', {}), data.get('annotations', {}), data.get('reading_history', {}), data.get('preferences', {}))
+            if os.path.exists(bookmarks_path):
+                with open(bookmarks_path, 'r') as file:
+                    for name, file_path, position in self.legacy_bookmarks(json.load(file)):
+                        self.connection.execute('INSERT OR IGNORE INTO bookmarks VALUES (?, ?, ?)', (name, file_path, json.dumps(position)))
+            self.connection.execute("INSERT INTO meta VALUES ('migrated', ?)", (datetime.now().isoformat(),))
+    @staticmethod
+    def legacy_bookmarks(bookmarks):
+        """Yield (name, file_path, position) from either bookmarks.json layout"""
+        for key, value in bookmarks.items():
+            if isinstance(value, dict):
+                for page, bookmark in value.items():
+                    yield f"{bookmark.get('title', 'Page')} (Page {int(page) + 1})", key, int(page)
+            else:
+                yield key, value[0], value[1]
+    def write_all(self, bookmarks, annotations, reading_history, preferences):
+        preferences = dict(preferences)
+        positions = preferences.pop('reading_position', {})
+        self.connection.executemany('INSERT OR REPLACE INTO bookmarks VALUES (?, ?, ?)', [(name, file_path, json.dumps(position)) for name, (file_path, position) in bookmarks.items()])
+        self.connection.executemany('INSERT OR REPLACE INTO annotations VALUES (?, ?)', annotations.items())
+        self.connection.executemany('INSERT OR REPLACE INTO reading_history VALUES (?, ?)', reading_history.items())
+        self.connection.executemany('INSERT OR REPLACE INTO reading_positions VALUES (?, ?)', positions.items())
+        self.connection.executemany('INSERT OR REPLACE INTO preferences VALUES (?, ?)', [(key, json.dumps(value)) for key, value in preferences.items()])
+    def load(self):
+        preferences = {key: json.loads(value) for key, value in self.connection.execute('SELECT key, value FROM preferences')}
+        preferences['reading_position'] = dict(self.connection.execute('SELECT file_path, position FROM reading_positions'))
+        return {
+            'bookmarks': {name: (file_path, json.loads(position)) for name, file_path, position in self.connection.execute('SELECT name, file_path, position FROM bookmarks ORDER BY rowid')},
+            'annotations': dict(self.connection.execute('SELECT name, content FROM annotations ORDER BY rowid')),
+            'reading_history': dict(self.connection.execute('SELECT file_path, last_opened FROM reading_history ORDER BY rowid')),
+            'preferences': preferences,
+        }
+    @contextmanager
+    def transaction(self):
+        with self.lock, self.connection:
+            yield self.connection
+    def bookmarks_for(self, file_path):
+        with self.lock:
+            return {name: json.loads(position) for name, position in self.connection.execute('SELECT name, position FROM bookmarks WHERE file_path = ? ORDER BY rowid', (file_path,))}
+    def set_bookmark(self, name, file_path, position):
+        with self.transaction():
+            self.connection.execute('INSERT INTO bookmarks VALUES (?, ?, ?) ON CONFLICT(name) DO UPDATE SET file_path = excluded.file_path, position = excluded.position', (name, file_path, json.dumps(position)))
+    def delete_bookmark(self, name):
+        with self.transaction():
+            self.connection.execute('DELETE FROM bookmarks WHERE name = ?', (name,))
+    def set_annotation(self, name, content):
+        with self.transaction():
+            self.connection.execute('INSERT INTO annotations VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET content = excluded.content', (name, content))
+    def set_reading_history(self, file_path, last_opened):
+        with self.transaction():
+            self.connection.execute('INSERT INTO reading_history VALUES (?, ?) ON CONFLICT(file_path) DO UPDATE SET last_opened = excluded.last_opened', (file_path, last_opened))
+    def set_reading_positions(self, positions):
+        with self.transaction():
+            self.connection.executemany('INSERT INTO reading_positions VALUES (?, ?) ON CONFLICT(file_path) DO UPDATE SET position = excluded.position', positions.items())
+    def set_preference(self, key, value):
+        with self.transaction():
+            self.connection.execute('INSERT INTO preferences VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value', (key, json.dumps(value)))
+    def close(self):
+        with self.lock:
+            self.connection.close()
 
 class EbookReader:
     def __init__(self, root):
@@ -34,11 +1187,30 @@ class EbookReader:
         self.search_history = deque(maxlen=10) 
         self.highlight_tags = [] 
         self.preferences = {'font_size': 12,'font_family': 'Arial','reading_position': {},'window_size': '1200x700'}
+        self.store = ReaderStore()
         self.load_data()
+        self.writer = WriteBehindQueue(self.preferences.get('write_delay', 1.0))
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.render_cache = PageRenderCache(self.preferences.get('render_cache_mb', 256) * 1024 * 1024)
+        self.tile_view = None
+        self.displayed_page = None
+        self.awaiting_render = None
+        self.prefetcher = None
+        self.render_pool = ProcessPoolExecutor(max_workers=1)
+        self.search_index = None
+        self.search_worker = None
+        self.thumbnail_generator = None
+        self.library_search = None
+        self.library_scan = None
+        self.open_times = []
+        self.library_hits = {}
+        self.continuous_mode = tk.BooleanVar(value=self.preferences.get('continuous_scroll', False))
+        self.reading_direction = 1
         self.setup_ui()
         self.setup_keyboard_shortcuts()
     def setup_keyboard_shortcuts(self):
         self.root.bind('<Control-f>', lambda e: self.focus_search())
+        self.root.bind('<Control-F>', lambda e: self.search_library())
         self.root.bind('<Control-b>', lambda e: self.toggle_sidebar())
         self.root.bind('<Control-h>', lambda e: self.show_search_history())
         self.root.bind('<Control-s>', lambda e: self.save_current_state())
@@ -47,8 +1219,8 @@ class EbookReader:
     def save_current_state(self):
         """Save current reading state"""
         if self.current_file:
-            self.preferences['reading_position'][self.current_file] = self.current_page
-            self.save_data()
+            self.save_reading_position()
+            self.writer.flush()
             self.show_info_message("Save", "Current reading state saved")
     def reset_view(self):
         """Reset view settings"""
@@ -108,13 +1280,13 @@ class EbookReader:
         self.search_combo.focus_set()
     def toggle_theme(self):
         """Toggle between light and dark theme"""
-        if self.preferences['theme'] == 'light':
+        if self.preferences.get('theme', 'light') == 'light':
             self.preferences['theme'] = 'dark'
             self.apply_dark_theme()
         else:
             self.preferences['theme'] = 'light'
             self.apply_light_theme()
-        self.save_data()   
+        self.persist(('preference', 'theme'), self.store.set_preference, 'theme', self.preferences['theme'])
     def apply_dark_theme(self):
         style = ttk.Style()
         style.configure(".", background='#2d2d2d', foreground='#ffffff')
@@ -140,6 +1312,7 @@ class EbookReader:
         self.root.bind('<Right>', lambda event: self.next_page())
         self.root.bind('<Control-o>', lambda event: self.open_file())
         self.root.bind('<Enter>', lambda event: self.search_text())
+        self.root.bind('<Escape>', lambda event: self.cancel_search())
         style=ttk.Style()
         style.configure("Search.TButton", background="#16347d", foreground="black",padding=6,relief="flat")  
     def create_menu(self):
@@ -156,8 +1329,12 @@ class EbookReader:
         view_menu.add_command(label="Zoom In", command=lambda: self.zoom(1.1))
         view_menu.add_command(label="Zoom Out", command=lambda: self.zoom(0.9))
         view_menu.add_command(label="Reset Zoom", command=lambda: self.zoom(reset=True))
+        view_menu.add_checkbutton(label="Continuous Scroll", variable=self.continuous_mode, command=self.toggle_continuous_mode)
         tools_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Tools", menu=tools_menu)
+        tools_menu.add_command(label="Search Library", command=self.search_library)
+        tools_menu.add_command(label="Add Library Folder", command=self.add_library_folder)
+        tools_menu.add_command(label="Scan Library", command=self.scan_library)
         tools_menu.add_command(label="Export Annotations", command=self.export_annotations)
         tools_menu.add_command(label="Reading Statistics", command=self.show_statistics)
     def setup_sidebar(self):
@@ -169,11 +1346,17 @@ class EbookReader:
         self.bookmark_list = tk.Listbox(self.bookmark_frame, justify=tk.CENTER)
         self.bookmark_list.pack(fill=tk.BOTH, expand=True, pady=3)
         self.bookmark_list.bind('<<ListboxSelect>>', self.go_to_bookmark)
+        self.thumbnail_frame = ttk.Frame(self.sidebar)
+        self.sidebar.add(self.thumbnail_frame, text="🖼Pages")
+        self.thumbnail_strip = ThumbnailStrip(self.thumbnail_frame, self.go_to_thumbnail, self.focus_thumbnails, self.preferences.get('thumbnail_width', 120))
         self.toc_frame = ttk.Frame(self.sidebar)
         # self.sidebar.add(self.toc_frame, text="Contents")
         self.toc_tree = ttk.Treeview(self.toc_frame)
         self.toc_tree.pack(fill=tk.BOTH, expand=True)
         self.toc_tree.bind('<<TreeviewSelect>>', self.go_to_toc_item)
+        self.toc_tree.bind('<<TreeviewOpen>>', self.expand_toc_item)
+        self.toc = []
+        self.toc_index = {}
         self.notes_frame = ttk.Frame(self.sidebar)
         self.sidebar.add(self.notes_frame, text="📝Notes")
         self.setup_notes_ui()
@@ -195,6 +1378,11 @@ class EbookReader:
         text_scrollbar.pack(side=tk.LEFT, fill=tk.Y)
         self.text_area.pack(fill=tk.BOTH, expand=True)
         self.text_area.config(yscrollcommand=text_scrollbar.set)
+        self.text_view = VirtualTextView(self.text_area, text_scrollbar, self.preferences.get('text_window_lines', 2000), self.schedule_highlight)
+        self.highlight_after_id = None
+        self.text_area.tag_config('search', background='#FFFFE0', borderwidth=1, relief="solid")
+        self.text_area.tag_config('current_search', background='#FFD700', borderwidth=1, relief="solid")
+        self.text_area.tag_raise('current_search', 'search')
         self.pdf_frame = ttk.Frame(self.content_notebook)
         self.content_notebook.add(self.pdf_frame, text="PDF View")
         pdf_scroll_y = ttk.Scrollbar(self.pdf_frame, orient=tk.VERTICAL)
@@ -203,7 +1391,10 @@ class EbookReader:
         pdf_scroll_y.pack(side=tk.LEFT, fill=tk.Y)
         pdf_scroll_x.pack(side=tk.BOTTOM, fill=tk.X)
         self.pdf_canvas.pack(fill=tk.BOTH, expand=True)
-        self.pdf_canvas.config(yscrollcommand=pdf_scroll_y.set, xscrollcommand=pdf_scroll_x.set)
+        self.tile_view = TiledPageView(self.pdf_canvas, self.render_cache)
+        self.continuous_view = ContinuousPageView(self.pdf_canvas, self.cached_page_image, self.request_continuous_pages, self.on_continuous_page_changed)
+        self.pdf_canvas.config(yscrollcommand=lambda *args: (pdf_scroll_y.set(*args), self.refresh_pdf_view()), xscrollcommand=lambda *args: (pdf_scroll_x.set(*args), self.refresh_pdf_view()))
+        self.pdf_canvas.bind("<Configure>", lambda event: self.refresh_pdf_view())
         pdf_scroll_y.config(command=self.pdf_canvas.yview)
         pdf_scroll_x.config(command=self.pdf_canvas.xview)
         self.pdf_canvas.bind("<MouseWheel>", self.on_pdf_scroll)
@@ -290,7 +1481,8 @@ class EbookReader:
         self.search_combo.pack(side=tk.LEFT, fill=tk.X, expand=True)
         self.case_sensitive_var = tk.BooleanVar()
         self.whole_word_var = tk.BooleanVar()
-        for text, var in [("Aa", self.case_sensitive_var), ("W", self.whole_word_var)]:
+        self.regex_var = tk.BooleanVar()
+        for text, var in [("Aa", self.case_sensitive_var), ("W", self.whole_word_var), (".*", self.regex_var)]:
             ttk.Checkbutton(search_frame, text=text, variable=var, command=self.update_search).pack(side=tk.LEFT)
         search_button = ctk.CTkButton(search_frame, text="Search🔍", command=self.search_text,fg_color="#2c3ff2", text_color="white", corner_radius=25,font=("Arial", 14), width=50)
         search_button.pack(side=tk.LEFT, padx=2)
@@ -316,87 +1508,131 @@ class EbookReader:
         self.notes_list = tk.Listbox(self.notes_frame)
         self.notes_list.pack(fill=tk.BOTH, expand=True, pady=3)
         self.notes_list.bind('<<ListboxSelect>>', self.go_to_note)
-    def open_file(self):
-        file_path = filedialog.askopenfilename(
-            filetypes=[("All supported files", "*.txt *.pdf"),("Text files", "*.txt"),("PDF files", "*.pdf"),("All files", "*.*") ])
+    def open_file(self, file_path=None):
+        if file_path is None:
+            file_path = filedialog.askopenfilename(
+                filetypes=[("All supported files", "*.txt *.pdf"),("Text files", "*.txt"),("PDF files", "*.pdf"),("All files", "*.*") ])
         if not file_path:
             return   
+        started = time.perf_counter()
         self.current_file = file_path
         self.file_label.config(text=f"Opened: {os.path.basename(file_path)}")
-        self.update_reading_history()
         if file_path.lower().endswith('.pdf'):
-            self.open_pdf(file_path)
+            opened = self.open_pdf(file_path)
         else:
-            self.open_text(file_path)   
+            opened = self.open_text(file_path)
+        if opened:
+            self.root.update_idletasks()
+            self.report_first_page(file_path, time.perf_counter() - started)
+            self.root.after_idle(self.finish_open, file_path)
+    def report_first_page(self, file_path, elapsed):
+        self.open_times.append(elapsed)
+        self.status_label.config(text=f"{os.path.basename(file_path)}: first page in {elapsed * 1000:.0f} ms")
+    def finish_open(self, file_path):
+        """Second stage of opening: everything the first page does not need, run once it is on screen"""
+        if file_path != self.current_file:
+            return
+        if self.pdf_document:
+            self.start_thumbnails(file_path)
+            self.thumbnail_strip.set_current(self.current_page)
+            self.focus_thumbnails(self.current_page)
+            threading.Thread(target=self.load_search_index, args=(file_path,), daemon=True).start()
+            self.extract_pdf_toc()
+        self.update_bookmark_list()
+        self.update_reading_history()
     def open_pdf(self, file_path):
+        """First stage of opening a PDF: restore the saved page and render it once"""
         try:
             self.pdf_document = fitz.open(file_path)
+            self.text_view.detach()
+            self.render_cache.clear()
+            if self.prefetcher:
+                self.prefetcher.stop()
+            self.prefetcher = PagePrefetcher(self.root, file_path, len(self.pdf_document), self.render_cache, self.on_page_prefetched, self.render_pool, self.preferences.get('prefetch_pages', 2))
+            self.search_index = None
+            self.reset_search()
+            if self.thumbnail_generator:
+                self.thumbnail_generator.cancel()
+                self.thumbnail_generator = None
+            self.thumbnail_strip.clear()
             self.total_pages = len(self.pdf_document)
             self.page_total_label.config(text=f"/{self.total_pages}")
-            self.current_page = 0
-            self.load_pdf_page()
-            self.extract_pdf_toc()
-            self.content_notebook.select(self.pdf_frame) 
-            if file_path in self.preferences['reading_position']:
-                self.current_page = self.preferences['reading_position'][file_path]
-                self.load_pdf_page()
+            saved_page = self.preferences['reading_position'].get(file_path, 0)
+            self.current_page = min(max(saved_page, 0), self.total_pages - 1)
+            self.content_notebook.select(self.pdf_frame)
+            self.load_pdf_page(block=True)
+            return True
         except Exception as e:
             self.show_error_message("Error", f"Failed to open PDF: {str(e)}")
+            return False
+    def load_search_index(self, file_path):
+        """Load or build the search index for file_path off the Tk thread"""
+        try:
+            index = SearchIndex.load(file_path)
+            if index is None:
+                index = SearchIndex.build(file_path, pool=TextExtractionPool(self.preferences.get('extraction_workers')))
+                index.save(file_path)
+        except Exception as e:
+            print(f"Error building search index: {e}")
+            return
+        self.root.after(0, self.on_search_index_ready, file_path, index)
+    def on_search_index_ready(self, file_path, index):
+        if file_path == self.current_file:
+            self.search_index = index
+    def start_thumbnails(self, file_path):
+        """Show cached thumbnails at once and generate the missing ones in the background"""
+        if self.thumbnail_generator:
+            self.thumbnail_generator.cancel()
+        cache = ThumbnailCache(file_path, self.thumbnail_strip.width)
+        self.thumbnail_strip.load(cache, self.total_pages)
+        self.thumbnail_generator = ThumbnailGenerator(self.root, file_path, cache, self.on_thumbnails_ready)
+    def on_thumbnails_ready(self, generator, pages):
+        if generator is self.thumbnail_generator:
+            self.thumbnail_strip.pages_ready(pages)
+    def focus_thumbnails(self, page_num):
+        if self.thumbnail_generator:
+            self.thumbnail_generator.focus(page_num)
+    def go_to_thumbnail(self, page_num):
+        self.current_page = page_num
+        self.load_pdf_page()
     def open_text(self, file_path):
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            self.text_area.delete(1.0, tk.END)
-            self.text_area.insert(1.0, content)
+            self.pdf_document = None
+            if self.thumbnail_generator:
+                self.thumbnail_generator.cancel()
+                self.thumbnail_generator = None
+            self.thumbnail_strip.clear()
+            self.reset_search()
+            self.text_view.attach(LineIndexedFile(file_path))
             self.content_notebook.select(self.text_frame)
-            self.update_bookmark_list()
+            return True
         except Exception as e:
-            self.show_error_message("Error", f"Failed to open text file: {str(e)}")           
+            self.show_error_message("Error", f"Failed to open text file: {str(e)}")
+            return False           
     def zoom(self, factor=None, reset=False):
         if reset:
             self.current_zoom = 1.0
         elif factor:
             self.current_zoom *= factor       
         if self.pdf_document:
-            self.load_pdf_page()
-    def save_bookmarks(self):
-        with open('bookmarks.json', 'w') as f:
-            json.dump(self.bookmarks, f)
-        with open('bookmarks.json', 'w') as f:
-            json.dump(self.bookmarks, f)
-
-    def load_bookmarks(self):
-        if os.path.exists('bookmarks.json'):
-            with open('bookmarks.json', 'r') as f:
-                self.bookmarks = json.load(f)
-            self.update_bookmark_list()
-    def add_bookmark(self):
-        if not self.current_file:
-            self.show_warning_message("Warning", "Please open a file first")
-            return
-        if self.pdf_document:
-            position = self.current_page
-            context = f"Page {self.current_page + 1}"
-        else:
-            position = self.text_area.index(tk.INSERT)
-            context = self.text_area.get("insert linestart", "insert lineend")
-        bookmark_name = simpledialog.askstring("Add Bookmark", "Enter bookmark name:", initialvalue=context)
-        if bookmark_name:
-            self.bookmarks[bookmark_name] = (self.current_file, position)
-            self.update_bookmark_list()
-            self.save_data()
-    def save_note(self):
-        note_content = self.notes_text.get(1.0, tk.END).strip()
-        if note_content:
-            note_name = simpledialog.askstring("Save Note", "Enter note name:")
-            if note_name:
-                self.annotations[note_name] = note_content
-                self.update_notes_list()
-                self.save_data()
-    def update_bookmark_list(self):
-        self.bookmark_list.delete(0, tk.END)
-        for index, name in enumerate(self.bookmarks, start=1):
-            self.bookmark_list.insert(tk.END, f"{index} )  {name}")
+            if self.continuous_mode.get() or self.render_key(self.current_page) in self.render_cache or not self.show_zoom_preview():
+                self.load_pdf_page()
+    def show_zoom_preview(self):
+        """Show the current page bitmap rescaled to the new zoom while the sharp render runs in the background"""
+        if not self.prefetcher or not self.displayed_page:
+            return False
+        page_num, zoom, image = self.displayed_page
+        page = self.pdf_document[self.current_page]
+        if page_num != self.current_page or TiledPageView.needs_tiling(page, fitz.Matrix(self.current_zoom, self.current_zoom)):
+            return False
+        scale = self.current_zoom / zoom
+        preview = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))))
+        self.pdf_canvas.delete("all")
+        self.tile_view.clear()
+        self.show_pdf_image(preview)
+        self.awaiting_render = self.render_key(self.current_page)
+        self.prefetcher.request(self.current_page, self.current_zoom, self.preferences.get('theme', 'light'), self.reading_direction)
+        return True
     def update_notes_list(self):
         self.notes_list.delete(0, tk.END)
         for name in self.annotations:
@@ -441,17 +1677,23 @@ class EbookReader:
             position = self.current_page
             context = f"Page {self.current_page + 1}"
         else:
-            position = self.text_area.index(tk.INSERT)
+            position = self.text_view.offset_for_index(tk.INSERT)
             context = self.text_area.get("insert linestart", "insert lineend")
             
         bookmark_name = simpledialog.askstring("Add Bookmark", "Enter bookmark name:", initialvalue=context)
         if bookmark_name:
             self.bookmarks[bookmark_name] = (self.current_file, position)
             self.update_bookmark_list()
-            self.save_data()                   
+            self.persist(('bookmark', bookmark_name), self.store.set_bookmark, bookmark_name, self.current_file, position)
     def update_bookmark_list(self):
+        """List the open file's bookmarks first, then those in other files"""
         self.bookmark_list.delete(0, tk.END)
-        for index, name in enumerate(self.bookmarks, start=1):
+        current = []
+        if self.current_file:
+            self.writer.flush()
+            current = [name for name in self.store.bookmarks_for(self.current_file) if name in self.bookmarks]
+        names = current + [name for name in self.bookmarks if name not in current]
+        for index, name in enumerate(names, start=1):
             self.bookmark_list.insert(tk.END, f"{index}. {name}")                   
     def go_to_bookmark(self, event):
         selection = event.widget.curselection()
@@ -465,7 +1707,7 @@ class EbookReader:
                 self.current_page = position
                 self.load_pdf_page()
             else:
-                self.text_area.mark_set(tk.INSERT, position)
+                self.text_area.mark_set(tk.INSERT, self.text_view.index_for_position(position))
                 self.text_area.see(tk.INSERT)
     def save_note(self):
         note_content = self.notes_text.get(1.0, tk.END).strip()
@@ -473,7 +1715,7 @@ class EbookReader:
             note_name = simpledialog.askstring("Save Note", "Enter note name:")
             if note_name:
                 self.annotations[note_name] = note_content
-                self.save_data()
+                self.persist(('annotation', note_name), self.store.set_annotation, note_name, note_content)
     def export_annotations(self):
         if not self.annotations:
             self.show_info_message("Info", "No annotations to export")
@@ -489,23 +1731,83 @@ class EbookReader:
         total_bookmarks = len(self.bookmarks)
         total_notes = len(self.annotations)
         stats_message = (f"Total books read: {total_books}\n"f"Total bookmarks: {total_bookmarks}\n"f"Total notes: {total_notes}")
+        if self.open_times:
+            stats_message += f"\nTime to first page: {self.open_times[-1] * 1000:.0f} ms last open, {sum(self.open_times) / len(self.open_times) * 1000:.0f} ms average"
+        if os.path.exists('library_catalog.db'):
+            catalog = LibraryCatalog()
+            try:
+                library = catalog.summary()
+            finally:
+                catalog.close()
+            stats_message += f"\nLibrary: {library['files']} files, {library['pages']} pages"
         self.show_info_message("Reading Statistics", stats_message)
+    def add_library_folder(self):
+        directory = filedialog.askdirectory(title="Add Library Folder")
+        if directory:
+            directories = self.preferences.setdefault('library_dirs', [])
+            if directory not in directories:
+                directories.append(directory)
+                self.persist(('preference', 'library_dirs'), self.store.set_preference, 'library_dirs', list(directories))
+            self.scan_library()
+    def scan_library(self):
+        """Sync the library catalog with the configured folders on a background thread"""
+        directories = self.preferences.get('library_dirs', [])
+        if not directories:
+            self.add_library_folder()
+            return
+        if self.library_scan:
+            self.show_info_message("Library", "A library scan is already running")
+            return
+        self.library_scan = threading.Event()
+        progress = lambda done, total: self.root.after(0, lambda: self.status_label.config(text=f"Scanning library: {done}/{total} files"))
+        scanner = LibraryScanner(directories, max_workers=self.preferences.get('extraction_workers'), progress=progress, cancelled=self.library_scan)
+        def run():
+            try:
+                stats = scanner.scan()
+            except Exception as e:
+                self.root.after(0, self.on_library_scanned, None, e)
+                return
+            self.root.after(0, self.on_library_scanned, stats, None)
+        self.status_label.config(text="Scanning library...")
+        threading.Thread(target=run, daemon=True).start()
+    def on_library_scanned(self, stats, error):
+        self.library_scan = None
+        if error:
+            self.status_label.config(text="Library scan failed")
+            self.show_error_message("Library", f"Library scan failed: {error}")
+            return
+        summary = format_scan_stats(stats)
+        print(summary)
+        self.status_label.config(text=summary.splitlines()[0])
     def update_reading_history(self):
         if self.current_file:
             self.reading_history[self.current_file] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.save_data()
-    def save_data(self):
-        data = {'bookmarks': self.bookmarks,'annotations': self.annotations,'reading_history': self.reading_history, 'preferences': self.preferences}
-        with open('ebook_reader_data.pkl', 'wb') as file:
-            pickle.dump(data, file)
+            self.persist(('reading_history', self.current_file), self.store.set_reading_history, self.current_file, self.reading_history[self.current_file])
+    def persist(self, key, write, *args):
+        """Queue a write behind the UI; a later write with the same key supersedes it"""
+        self.writer.put(key, lambda: write(*args))
+    def save_reading_position(self):
+        self.preferences['reading_position'][self.current_file] = self.current_page
+        self.persist(('reading_position', self.current_file), self.store.set_reading_positions, {self.current_file: self.current_page})
     def load_data(self):
-        if os.path.exists('ebook_reader_data.pkl'):
-            with open('ebook_reader_data.pkl', 'rb') as file:
-                data = pickle.load(file)
-                self.bookmarks = data.get('bookmarks', {})
-                self.annotations = data.get('annotations', {})
-                self.reading_history = data.get('reading_history', {})
-                self.preferences = data.get('preferences', self.preferences)
+        try:
+            self.store.migrate()
+        except Exception as e:
+            print(f"Error migrating legacy data: {e}")
+        data = self.store.load()
+        self.bookmarks = data['bookmarks']
+        self.annotations = data['annotations']
+        self.reading_history = data['reading_history']
+        self.preferences = {**self.preferences, **data['preferences']}
+    def on_close(self):
+        if self.library_scan:
+            self.library_scan.set()
+        if self.prefetcher:
+            self.prefetcher.stop()
+        self.render_pool.shutdown(wait=False, cancel_futures=True)
+        self.writer.close()
+        self.store.close()
+        self.root.destroy()
     def show_recent_files(self):
         recent_files = list(self.reading_history.keys())[-10:]
         recent_files_message = "\n".join(recent_files)
@@ -513,10 +1815,12 @@ class EbookReader:
     def prev_page(self):
         if self.current_page > 0:
             self.current_page -= 1
+            self.reading_direction = -1
             self.load_pdf_page()
     def next_page(self):
         if self.current_page < (self.total_pages - 1):
             self.current_page += 1
+            self.reading_direction = 1
             self.load_pdf_page()
     def search_text(self):
         """Enhanced search functionality with options"""
@@ -526,50 +1830,141 @@ class EbookReader:
         if search_term not in self.search_history:
             self.search_history.append(search_term)
             self.search_combo['values'] = list(self.search_history)
+        self.cancel_search()
         self.search_results.clear()
         self.current_search_index = 0
         case_sensitive = self.case_sensitive_var.get()
         whole_word = self.whole_word_var.get()
+        regex = self.regex_var.get()
+        try:
+            compile_search_pattern(search_term, case_sensitive, whole_word, regex)
+        except re.error as e:
+            self.show_error_message("Search", f"Invalid regular expression: {e}")
+            return
         if self.pdf_document:
-            self.search_pdf(search_term, case_sensitive, whole_word)
+            self.search_pdf(search_term, case_sensitive, whole_word, regex)
         else:
-            self.search_text_document(search_term, case_sensitive, whole_word)
+            self.search_text_document(search_term, case_sensitive, whole_word, regex)
+            self.update_search_display()
+    def search_pdf(self, search_term, case_sensitive, whole_word, regex=False):
+        """Enhanced PDF search, streamed from a worker thread"""
+        pattern = compile_search_pattern(search_term, case_sensitive, whole_word, regex)
+        pages = range(self.total_pages)
+        if self.search_index and not regex:
+            candidates = self.search_index.candidate_pages(search_term, whole_word)
+            if candidates is not None:
+                pages = candidates
+        self.result_counter.config(text="0/0")
+        self.status_label.config(text=f"Searching for '{search_term}'...")
+        self.search_worker = SearchWorker(self.root, self.current_file, pages, pattern, self.on_search_batch, self.on_search_done, max_workers=self.preferences.get('extraction_workers'))
+    def on_search_batch(self, worker, hits, pages_done, pages_total):
+        if worker is not self.search_worker:
+            return
+        first_hits = not self.search_results and hits
+        self.search_results.extend(hits)
+        self.progress_var.set(pages_done / pages_total * 100 if pages_total else 100)
+        if self.search_results:
+            self.result_counter.config(text=f"{self.current_search_index + 1}/{len(self.search_results)}")
+        if first_hits:
+            self.show_search_result()
+    def on_search_done(self, worker):
+        if worker is not self.search_worker:
+            return
+        self.search_worker = None
+        self.progress_var.set(0)
+        self.status_label.config(text=f"Search finished: {len(self.search_results)} results")
+        if not self.search_results:
+            self.result_counter.config(text="0/0")
+            self.show_info_message("Search", "No results found")
+    def cancel_search(self):
+        if self.search_worker:
+            self.search_worker.cancel()
+            self.search_worker = None
+            self.progress_var.set(0)
+            self.status_label.config(text="Search cancelled")
+    def reset_search(self):
+        """Stop any running search and drop its results, so nothing from the previous file reaches the next one"""
+        self.cancel_search()
+        self.search_results.clear()
+        self.current_search_index = 0
+        self.result_counter.config(text="0/0")
+    def search_library(self):
+        """Search every PDF/TXT in the reading history, streaming per-file results into a panel"""
+        search_term = simpledialog.askstring("Search Library", "Search all files in the reading history for:", initialvalue=self.search_var.get())
+        if not search_term:
+            return
+        query = (search_term, self.case_sensitive_var.get(), self.whole_word_var.get(), self.regex_var.get())
+        try:
+            compile_search_pattern(*query)
+        except re.error as e:
+            self.show_error_message("Search", f"Invalid regular expression: {e}")
+            return
+        files = [path for path in self.reading_history if path.lower().endswith(('.pdf', '.txt')) and os.path.exists(path)]
+        if self.library_search:
+            self.library_search.cancel()
+        window = tk.Toplevel(self.root)
+        window.title(f"Library search: {search_term}")
+        window.geometry("700x500")
+        status = ttk.Label(window, text=f"Searching {len(files)} files...")
+        status.pack(fill=tk.X, padx=5, pady=5)
+        tree = ttk.Treeview(window, columns=('matches',))
+        tree.heading('#0', text='File / hit')
+        tree.heading('matches', text='Matches')
+        tree.column('matches', width=80, stretch=False, anchor=tk.E)
+        scrollbar = ttk.Scrollbar(window, command=tree.yview)
+        tree.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+        tree.bind('<<TreeviewOpen>>', lambda event: self.expand_library_result(tree))
+        tree.bind('<<TreeviewSelect>>', lambda event: self.open_library_hit(tree))
+        self.library_hits = {}
+        totals = {'matches': 0, 'files': 0}
+        def on_batch(results, files_done, total_files):
+            for file_path, count, hits in results:
+                item = tree.insert('', tk.END, text=f"{os.path.basename(file_path)}  ({os.path.dirname(file_path)})", values=(count,))
+                tree.insert(item, tk.END, text='…')
+                self.library_hits[item] = (file_path, hits)
+                totals['matches'] += count
+                totals['files'] += 1
+            status.config(text=f"Searched {files_done}/{total_files} files: {totals['matches']} matches in {totals['files']} files")
+        def on_done():
+            status.config(text=f"Done: {totals['matches']} matches in {totals['files']} of {len(files)} files")
+            self.library_search = None
+        search = LibrarySearch(self.root, files, query, on_batch, on_done, self.preferences.get('extraction_workers'))
+        self.library_search = search
+        window.protocol("WM_DELETE_WINDOW", lambda: (search.cancel(), window.destroy()))
+    def expand_library_result(self, tree):
+        """Insert a file's hit rows the first time it is expanded, so the panel only holds rows someone looked at"""
+        item = tree.focus()
+        if item not in self.library_hits or not tree.get_children(item) or tree.item(tree.get_children(item)[0], 'text') != '…':
+            return
+        tree.delete(*tree.get_children(item))
+        file_path, hits = self.library_hits[item]
+        for index, (position, label, excerpt) in enumerate(hits):
+            tree.insert(item, tk.END, iid=f"{item}:{index}", text=f"{label}: {excerpt}")
+        if int(tree.set(item, 'matches')) > len(hits):
+            tree.insert(item, tk.END, text=f"(first {len(hits)} matches shown)")
+    def open_library_hit(self, tree):
+        """Open the file behind the selected hit and show that match"""
+        selection = tree.selection()
+        if not selection or ':' not in selection[0]:
+            return
+        item, index = selection[0].rsplit(':', 1)
+        file_path, hits = self.library_hits[item]
+        if file_path != self.current_file:
+            self.open_file(file_path)
+            if file_path.lower().endswith('.pdf') != bool(self.pdf_document):
+                return
+        self.cancel_search()
+        self.search_results = [position for position, label, excerpt in hits]
+        self.current_search_index = int(index)
         self.update_search_display()
-    def search_pdf(self, search_term, case_sensitive, whole_word):
-        """Enhanced PDF search"""
-        for page_num in range(self.total_pages):
-            page = self.pdf_document[page_num]
-            if not case_sensitive:
-                search_term = search_term.lower()
-            text = page.get_text()
-            if not case_sensitive:
-                text = text.lower()
-            if whole_word:
-                pattern = r'\b' + re.escape(search_term) + r'\b'
-                matches = re.finditer(pattern, text)
-                for match in matches:
-                    rect = page.search_for(text[match.start():match.end()])
-                    if rect:
-                        self.search_results.append((page_num, rect[0]))
-            else:
-                rect_list = page.search_for(search_term)
-                for rect in rect_list:
-                    self.search_results.append((page_num, rect))
-    def search_text_document(self, search_term, case_sensitive, whole_word):
-        """Enhanced text document search"""
-        text = self.text_area.get('1.0', tk.END)  
-        if not case_sensitive:
-            text = text.lower()
-            search_term = search_term.lower()      
-        if whole_word:
-            pattern = r'\b' + re.escape(search_term) + r'\b'
-        else:
-            pattern = re.escape(search_term)
-            
-        for match in re.finditer(pattern, text):
-            start_index = f"1.0+{match.start()}c"
-            end_index = f"1.0+{match.end()}c"
-            self.search_results.append((start_index, end_index))
+    def search_text_document(self, search_term, case_sensitive, whole_word, regex=False):
+        """Enhanced text document search over the whole file, as absolute byte offsets"""
+        if not self.text_view.source:
+            return
+        engine = TextSearchEngine(self.text_view.source)
+        self.search_results.extend(engine.search(search_term, case_sensitive, whole_word, regex))
     def update_search_display(self):
         """Update search results display"""
         total_results = len(self.search_results)
@@ -581,13 +1976,26 @@ class EbookReader:
         else:
             self.result_counter.config(text="0/0")
             self.show_info_message("Search", "No results found")
-    def highlight_search_results(self):
+    def schedule_highlight(self):
+        """Coalesce scroll and window changes into one highlight pass"""
+        if self.highlight_after_id is None:
+            self.highlight_after_id = self.root.after(30, self.highlight_search_results)
+    def highlight_search_results(self, margin_lines=100, batch_size=500):
+        """Tag only the matches on screen plus a margin, in batched tag_add calls"""
+        if self.highlight_after_id is not None:
+            self.root.after_cancel(self.highlight_after_id)
+            self.highlight_after_id = None
         self.text_area.tag_remove('search', '1.0', tk.END)
-        for start_pos, end_pos in self.search_results:
-            if self.pdf_document:
-                continue
-            self.text_area.tag_add('search', start_pos, end_pos)
-        self.text_area.tag_config('search', background='#FFFFE0', borderwidth=1, relief="solid", bordercolor="red")
+        if self.pdf_document or not self.text_view.source or not self.search_results:
+            return
+        visible_start, visible_end = self.text_view.visible_offsets(margin_lines)
+        first = bisect.bisect_left(self.search_results, (visible_start,))
+        last = bisect.bisect_left(self.search_results, (visible_end,))
+        ranges = []
+        for start_pos, end_pos in self.search_results[first:last]:
+            ranges.extend((self.text_view.window_index(start_pos), self.text_view.window_index(min(end_pos, visible_end))))
+        for i in range(0, len(ranges), batch_size * 2):
+            self.text_area.tag_add('search', *ranges[i:i + batch_size * 2])
     def show_search_result(self):
         if not self.search_results:
             self.show_info_message("Search", "No results found")
@@ -597,16 +2005,22 @@ class EbookReader:
             self.current_page = page_num
             self.load_pdf_page()
             x0, y0, x1, y1 = inst
-            self.pdf_canvas.create_rectangle(x0 * self.current_zoom, y0 * self.current_zoom, x1 * self.current_zoom, y1 * self.current_zoom, outline='red', width=2)
-            self.pdf_canvas.config(scrollregion=self.pdf_canvas.bbox(tk.ALL))
-            self.pdf_canvas.yview_moveto(y0 * self.current_zoom / self.pdf_canvas.bbox(tk.ALL)[3])
-            self.pdf_canvas.xview_moveto(x0 * self.current_zoom / self.pdf_canvas.bbox(tk.ALL)[2])
+            origin_x, origin_y = self.continuous_view.page_origin(page_num) if self.continuous_mode.get() else (0, 0)
+            self.pdf_canvas.delete("search_box")
+            self.pdf_canvas.create_rectangle(origin_x + x0 * self.current_zoom, origin_y + y0 * self.current_zoom, origin_x + x1 * self.current_zoom, origin_y + y1 * self.current_zoom, outline='red', width=2, tags="search_box")
+            if self.tile_view.page is None and not self.continuous_mode.get():
+                self.pdf_canvas.config(scrollregion=self.pdf_canvas.bbox(tk.ALL))
+            _, _, scroll_width, scroll_height = [float(v) for v in self.pdf_canvas.cget('scrollregion').split()]
+            self.pdf_canvas.yview_moveto((origin_y + y0 * self.current_zoom) / scroll_height)
+            self.pdf_canvas.xview_moveto((origin_x + x0 * self.current_zoom) / scroll_width)
         else:
-            start_pos, end_pos = self.search_results[self.current_search_index]
+            start_offset, end_offset = self.search_results[self.current_search_index]
+            start_pos = self.text_view.index_for_offset(start_offset)
+            end_pos = self.text_view.window_index(end_offset)
+            self.text_area.tag_remove('current_search', '1.0', tk.END)
             self.text_area.mark_set(tk.INSERT, start_pos)
             self.text_area.see(tk.INSERT)
             self.text_area.tag_add('current_search', start_pos, end_pos)
-            self.text_area.tag_config('current_search', background='#FFFFE0', borderwidth=1, relief="solid", bordercolor="red")
     def prev_search_result(self):
         if self.search_results:
             self.current_search_index = (self.current_search_index - 1) % len(self.search_results)
@@ -615,14 +2029,109 @@ class EbookReader:
         if self.search_results:
             self.current_search_index = (self.current_search_index + 1) % len(self.search_results)
             self.show_search_result()
-    def load_pdf_page(self):
+    def load_pdf_page(self, block=False):
+        """Show current_page; a page missing from the render cache is requested from the prefetcher
+        and stood in for until it arrives, unless block is set (the first page of a newly opened file)"""
         if not self.pdf_document:
             return
+        if self.continuous_mode.get():
+            self.load_continuous_page()
+            return
+        self.continuous_view.clear()
         self.pdf_canvas.delete("all")
+        self.tile_view.clear()
         page = self.pdf_document[self.current_page]
-        pix = page.get_pixmap(matrix=fitz.Matrix(self.current_zoom, self.current_zoom))
-        image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        self.current_image = ImageTk.PhotoImage(image=image)
+        matrix = fitz.Matrix(self.current_zoom, self.current_zoom)
+        tiled = TiledPageView.needs_tiling(page, matrix)
+        self.awaiting_render = None
+        if tiled:
+            self.current_image = None
+            self.displayed_page = None
+            self.tile_view.show(page, matrix, self.render_key(self.current_page))
+        else:
+            key = self.render_key(self.current_page)
+            image = self.render_cache.get(key)
+            if image is None and self.prefetcher and not block:
+                self.displayed_page = None
+                self.show_page_placeholder(self.current_page)
+                self.awaiting_render = key
+            else:
+                if image is None:
+                    image = render_page(self.pdf_document, self.current_page, self.current_zoom)
+                    self.render_cache.put(key, image)
+                self.displayed_page = (self.current_page, self.current_zoom, image)
+                self.show_pdf_image(image)
+        self.page_shown(prefetch=not tiled)
+    def show_page_placeholder(self, page_num):
+        """Stand in for a page that is still rendering: its cached thumbnail scaled up, or a blank page outline"""
+        rect = self.pdf_document[page_num].rect * fitz.Matrix(self.current_zoom, self.current_zoom)
+        size = (max(1, round(rect.width)), max(1, round(rect.height)))
+        cache = self.thumbnail_strip.cache
+        if cache is not None and page_num in cache:
+            try:
+                with Image.open(cache.path(page_num)) as thumbnail:
+                    self.show_pdf_image(PageImage.from_pil(thumbnail.resize(size, Image.BILINEAR)))
+                return
+            except OSError:
+                pass
+        self.current_image = None
+        x = (self.pdf_canvas.winfo_width() - size[0]) // 4
+        y = (self.pdf_canvas.winfo_height() - size[1]) // 4
+        self.pdf_canvas.create_rectangle(x, y, x + size[0], y + size[1], fill='#ffffff', outline='#cccccc')
+        self.pdf_canvas.config(scrollregion=self.pdf_canvas.bbox(tk.ALL))
+    def show_rendered_page(self, image):
+        """Swap a placeholder or zoom preview for the finished render, keeping any search highlight"""
+        self.awaiting_render = None
+        self.displayed_page = (self.current_page, self.current_zoom, image)
+        self.pdf_canvas.addtag_all("stale")
+        self.pdf_canvas.dtag("search_box", "stale")
+        self.pdf_canvas.delete("stale")
+        self.show_pdf_image(image)
+        self.pdf_canvas.tag_raise("search_box")
+    def page_shown(self, prefetch=True):
+        """Update the page counter, thumbnails and saved position once current_page is on screen"""
+        self.page_var.set(str(self.current_page + 1))
+        self.thumbnail_strip.set_current(self.current_page)
+        stats = self.render_cache.stats()
+        self.status_label.config(text=f"Render cache: {stats['hits']} hits, {stats['misses']} misses")
+        if self.current_file:
+            self.save_reading_position()
+        if self.prefetcher and prefetch:
+            self.prefetcher.request(self.current_page, self.current_zoom, self.preferences.get('theme', 'light'), self.reading_direction)
+    def load_continuous_page(self):
+        """Scroll the continuous layout to current_page, laying the document out again if zoom or theme changed.
+        Zoom is capped below the size at which a page would need tiling, which this view does not do."""
+        zoom_limit = self.continuous_view.zoom_limit(self.pdf_document, self.current_file)
+        capped = self.current_zoom > zoom_limit
+        if capped:
+            self.current_zoom = zoom_limit
+        layout_key = (self.current_file, round(self.current_zoom, 4), self.preferences.get('theme', 'light'))
+        if self.continuous_view.layout_key != layout_key:
+            self.pdf_canvas.delete("all")
+            self.tile_view.clear()
+            self.current_image = None
+            self.displayed_page = None
+            self.awaiting_render = None
+            self.continuous_view.layout(self.pdf_document, self.current_zoom, layout_key)
+        self.continuous_view.current_page = self.current_page
+        self.continuous_view.scroll_to_page(self.current_page)
+        self.page_shown(prefetch=False)
+        if capped:
+            self.status_label.config(text=f"Zoom limited to {self.current_zoom:.0%} in continuous mode")
+    def on_continuous_page_changed(self, page_num):
+        if page_num != self.current_page:
+            self.reading_direction = 1 if page_num > self.current_page else -1
+            self.current_page = page_num
+            self.page_shown(prefetch=False)
+    def refresh_pdf_view(self):
+        self.tile_view.refresh()
+        self.continuous_view.refresh()
+    def toggle_continuous_mode(self):
+        self.preferences['continuous_scroll'] = self.continuous_mode.get()
+        self.persist(('preference', 'continuous_scroll'), self.store.set_preference, 'continuous_scroll', self.preferences['continuous_scroll'])
+        self.load_pdf_page()
+    def show_pdf_image(self, image):
+        self.current_image = image.photo()
         canvas_width = self.pdf_canvas.winfo_width()
         canvas_height = self.pdf_canvas.winfo_height()
         image_width = self.current_image.width()
@@ -632,32 +2141,85 @@ class EbookReader:
         
         self.pdf_canvas.create_image(x_center, y_center, anchor=tk.NW, image=self.current_image)
         self.pdf_canvas.config(scrollregion=self.pdf_canvas.bbox(tk.ALL))
-        self.page_var.set(str(self.current_page + 1))
-        if self.current_file:
-            self.preferences['reading_position'][self.current_file] = self.current_page
+    def render_key(self, page_num):
+        return (page_num, round(self.current_zoom, 4), 0, self.preferences.get('theme', 'light'))
+    def cached_page_image(self, page_num):
+        return self.render_cache.get(self.render_key(page_num))
+    def request_continuous_pages(self, pages):
+        """Ask the prefetcher for the continuous view's missing pages; without one they are rendered inline"""
+        if self.prefetcher:
+            self.prefetcher.request_pages(pages, self.current_zoom, self.preferences.get('theme', 'light'))
+            return
+        for page_num in pages:
+            image = render_page(self.pdf_document, page_num, self.current_zoom)
+            self.render_cache.put(self.render_key(page_num), image)
+            self.continuous_view.page_ready(page_num, image)
+    def on_page_prefetched(self, prefetcher, key, image):
+        """Called on the Tk thread with a page rendered by the prefetcher; a failed render is retried inline only if it is on screen"""
+        if prefetcher is not self.prefetcher or not self.pdf_document:
+            return
+        continuous = self.continuous_mode.get()
+        awaited = key == self.awaiting_render == self.render_key(self.current_page) and not continuous
+        in_view = continuous and key == self.render_key(key[0]) and self.continuous_view.is_waiting(key[0])
+        if image is None:
+            if not (awaited or in_view):
+                return
+            try:
+                image = render_page(self.pdf_document, key[0], self.current_zoom)
+            except Exception as e:
+                if in_view:
+                    print(f"Error rendering page {key[0] + 1}: {e}")
+                    return
+                self.awaiting_render = None
+                self.show_error_message("Error", f"Failed to render page {key[0] + 1}: {e}")
+                return
+        self.render_cache.put(key, image)
+        if awaited:
+            self.show_rendered_page(image)
+        elif in_view:
+            self.continuous_view.page_ready(key[0], image)
     def extract_pdf_toc(self):
+        """Read the outline off the Tk thread; only its top level is inserted until nodes are expanded"""
         self.toc_tree.delete(*self.toc_tree.get_children())
-        toc = self.pdf_document.get_toc()
-        def add_toc_item(item, parent=""):
-            level, title, page = item
-            item_id = self.toc_tree.insert(parent, tk.END, text=title, values=(page,))
-            return item_id
-        parent_stack = [(0, "")]
-        for item in toc:
-            level = item[0]
-            while parent_stack and parent_stack[-1][0] >= level:
-                parent_stack.pop()
-            parent_id = parent_stack[-1][1]
-            new_id = add_toc_item(item, parent_id)
-            parent_stack.append((level, new_id))           
+        self.toc = []
+        self.toc_index = {}
+        file_path = self.current_file
+        def run():
+            try:
+                toc, index = load_toc(file_path)
+            except Exception as e:
+                print(f"Error reading table of contents: {e}")
+                return
+            self.root.after(0, self.on_toc_loaded, file_path, toc, index)
+        threading.Thread(target=run, daemon=True).start()
+    def on_toc_loaded(self, file_path, toc, index):
+        if file_path != self.current_file:
+            return
+        self.toc = toc
+        self.toc_index = index
+        self.insert_toc_children(-1, "")
+    def insert_toc_children(self, entry, parent):
+        """Insert an entry's direct children; those with children of their own get a placeholder so they can be opened"""
+        for child in self.toc_index.get(entry, ()):
+            level, title, page = self.toc[child][:3]
+            self.toc_tree.insert(parent, tk.END, iid=str(child), text=title, values=(page,))
+            if child in self.toc_index:
+                self.toc_tree.insert(str(child), tk.END, iid=f"{child}:more", text="…")
+    def expand_toc_item(self, event):
+        item = self.toc_tree.focus()
+        if self.toc_tree.exists(f"{item}:more"):
+            self.toc_tree.delete(f"{item}:more")
+            self.insert_toc_children(int(item), item)
     def go_to_toc_item(self, event):
         selected_item = self.toc_tree.selection()
-        if selected_item:
+        if selected_item and self.toc_tree.item(selected_item, 'values'):
             page_num = self.toc_tree.item(selected_item, 'values')[0]
             self.current_page = int(page_num) - 1
             self.load_pdf_page()        
     def on_pdf_scroll(self, event):
-        if event.delta > 0:
+        if self.continuous_mode.get():
+            self.pdf_canvas.yview_scroll(int(-event.delta / 120) * 3, "units")
+        elif event.delta > 0:
             self.prev_page()
         else:
             self.next_page()
@@ -667,7 +2229,145 @@ class EbookReader:
         messagebox.showwarning(title, message, icon='warning')
     def show_info_message(self, title, message):
         messagebox.showinfo(title, message, icon='info')
+def report_progress(label, done, total):
+    print(f"\r{label}: {done}/{total} ({done * 100 // max(total, 1)}%)", end='\n' if done >= total else '', file=sys.stderr, flush=True)
+
+def render_pages_to_png(file_path, page_numbers, output_dir, zoom):
+    """Render a run of pages to output_dir/page-NNNN.png using a private fitz handle"""
+    paths = []
+    with fitz.open(file_path) as document:
+        for page_num in page_numbers:
+            path = os.path.join(output_dir, f"page-{page_num + 1:04d}.png")
+            render_page(document, page_num, zoom).to_pil().save(path)
+            paths.append(path)
+    return paths
+
+def page_count_of(file_path):
+    with fitz.open(file_path) as document:
+        return len(document)
+
+def command_render(args):
+    pages = parse_page_ranges(args.pages, page_count_of(args.file))
+    os.makedirs(args.output, exist_ok=True)
+    done = 0
+    for chunk, _ in run_chunks(render_pages_to_png, args.file, page_chunks(pages, args.workers, 4), (args.output, args.dpi / 72), args.workers, ordered=False):
+        done += len(chunk)
+        if args.progress:
+            report_progress("Rendering", done, len(pages))
+    print(f"Rendered {len(pages)} pages to {args.output}")
+
+def command_export(args):
+    pages = parse_page_ranges(args.pages, page_count_of(args.file))
+    export_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if export_format not in ('txt', 'docx', 'pdf'):
+        raise ValueError(f"Unsupported export format {export_format!r}; use txt, docx or pdf")
+    progress = (lambda done, total: report_progress("Exporting", done, total)) if args.progress else None
+    export_pages(args.file, pages, args.output, progress=progress, max_workers=args.workers, export_format=export_format)
+    print(f"Exported {len(pages)} pages to {args.output}")
+
+def search_file(file_path, args):
+    """Search one PDF or text file, returning a JSON-ready dict of hits"""
+    if not file_path.lower().endswith('.pdf'):
+        source = LineIndexedFile(file_path)
+        try:
+            hits = []
+            for start, end in TextSearchEngine(source).search(args.term, args.case_sensitive, args.whole_word, args.regex):
+                line, column = source.line_col(start)
+                hits.append({'start': start, 'end': end, 'line': line + 1, 'column': column})
+        finally:
+            source.close()
+        return {'file': file_path, 'hits': hits}
+    pattern = compile_search_pattern(args.term, args.case_sensitive, args.whole_word, args.regex)
+    pages = parse_page_ranges(args.pages, page_count_of(file_path))
+    index = None if args.regex else SearchIndex.load(file_path)
+    candidates = index.candidate_pages(args.term, args.whole_word) if index else None
+    if candidates is not None:
+        pages = sorted(set(pages) & set(candidates))
+    hits = []
+    done = 0
+    for chunk, page_hits in run_chunks(search_pages, file_path, page_chunks(pages, args.workers, 4), (pattern,), args.workers, ordered=False):
+        hits.extend({'page': page_num + 1, 'rect': [round(v, 2) for v in rect]} for page_num, rect in page_hits)
+        done += len(chunk)
+        if args.progress:
+            report_progress(f"Searching {os.path.basename(file_path)}", done, len(pages))
+    hits.sort(key=lambda hit: (hit['page'], hit['rect'][1], hit['rect'][0]))
+    return {'file': file_path, 'pages_searched': len(pages), 'hits': hits}
+
+def command_search(args):
+    compile_search_pattern(args.term, args.case_sensitive, args.whole_word, args.regex)
+    results = {'term': args.term, 'files': [search_file(file_path, args) for file_path in args.files]}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+def command_index(args):
+    for file_path in args.files:
+        if not args.force and SearchIndex.load(file_path) is not None:
+            print(f"{file_path}: index is up to date")
+            continue
+        start = time.perf_counter()
+        progress = (lambda done, total: report_progress(f"Indexing {os.path.basename(file_path)}", done, total)) if args.progress else None
+        index = SearchIndex.build(file_path, progress, TextExtractionPool(args.workers))
+        index.save(file_path)
+        print(f"{file_path}: indexed {index.page_count} pages, {len(index.postings)} terms in {time.perf_counter() - start:.1f}s")
+
+def command_scan(args):
+    progress = (lambda done, total: report_progress("Cataloguing", done, total)) if args.progress else None
+    stats = LibraryScanner(args.directories, args.catalog, args.workers, progress).scan()
+    print(format_scan_stats(stats))
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='readify', description="Headless batch operations on PDF and text files. Run without arguments to start the reader.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--workers', type=int, help="worker processes (default: one per CPU)")
+    common.add_argument('--quiet', dest='progress', action='store_false', help="no progress output on stderr")
+    commands = parser.add_subparsers(dest='command', required=True)
+    render = commands.add_parser('render', parents=[common], help="render pages to PNG")
+    render.add_argument('file')
+    render.add_argument('--pages', default='1-', help='page ranges such as "1-50,75,100-" (default: all)')
+    render.add_argument('--dpi', type=float, default=150)
+    render.add_argument('--output', '-o', default='.', help="output directory")
+    render.set_defaults(handler=command_render)
+    export = commands.add_parser('export', parents=[common], help="export a page range as text, DOCX or PDF")
+    export.add_argument('file')
+    export.add_argument('--pages', default='1-')
+    export.add_argument('--format', choices=['txt', 'docx', 'pdf'], help="default: from the output extension")
+    export.add_argument('--output', '-o', required=True)
+    export.set_defaults(handler=command_export)
+    search = commands.add_parser('search', parents=[common], help="search files and print the hits as JSON")
+    search.add_argument('term')
+    search.add_argument('files', nargs='+')
+    search.add_argument('--pages', default='1-', help="PDF page ranges to search")
+    search.add_argument('--case-sensitive', action='store_true')
+    search.add_argument('--whole-word', action='store_true')
+    search.add_argument('--regex', action='store_true')
+    search.add_argument('--output', '-o', help="write JSON here instead of stdout")
+    search.set_defaults(handler=command_search)
+    index = commands.add_parser('index', parents=[common], help="build search indexes for PDFs")
+    index.add_argument('files', nargs='+')
+    index.add_argument('--force', action='store_true', help="rebuild even if the index is current")
+    index.set_defaults(handler=command_index)
+    scan = commands.add_parser('scan', parents=[common], help="catalog the PDF/TXT files under directories, incrementally")
+    scan.add_argument('directories', nargs='+')
+    scan.add_argument('--catalog', default='library_catalog.db')
+    scan.set_defaults(handler=command_scan)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.handler(args)
+    except (OSError, ValueError, re.error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main())
     try:
         ctypes.windll.shcore.SetProcessDpiAwareness(1)
     except Exception as e:
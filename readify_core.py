@@ -0,0 +1,435 @@
+"""Rendering, caching and persistence helpers shared by readify.py and updated_readify.py"""
+import json
+import os
+import re
+import zipfile
+import threading
+import time
+import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.sax.saxutils import escape as xml_escape
+import fitz
+from PIL import Image
+
+class PageRenderCache:
+    """LRU cache of rendered page images bounded by a memory ceiling in bytes"""
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+    @staticmethod
+    def image_size(image):
+        return len(image.data)
+    def get(self, key):
+        with self.lock:
+            image = self.entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return image
+    def put(self, key, image):
+        size = self.image_size(image)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.current_bytes -= self.image_size(self.entries.pop(key))
+            self.entries[key] = image
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= self.image_size(evicted)
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.current_bytes}
+
+class PageImage:
+    """A rendered page kept as PPM bytes, which Tk decodes straight into a PhotoImage without a PIL round trip"""
+    __slots__ = ('width', 'height', 'data')
+    def __init__(self, width, height, data):
+        self.width = width
+        self.height = height
+        self.data = data
+    @classmethod
+    def from_pixmap(cls, pix):
+        if pix.alpha:
+            pix = fitz.Pixmap(pix, 0)
+        return cls(pix.width, pix.height, pix.tobytes("ppm"))
+    @classmethod
+    def from_pil(cls, image):
+        image = image.convert("RGB")
+        return cls(image.width, image.height, f"P6\n{image.width} {image.height}\n255\n".encode() + image.tobytes())
+    def photo(self):
+        return tk.PhotoImage(data=self.data, format="PPM")
+    def to_pil(self):
+        """A PIL view over the pixel data, without copying it"""
+        pixels = memoryview(self.data)[len(self.data) - self.width * self.height * 3:]
+        return Image.frombuffer("RGB", (self.width, self.height), pixels, "raw", "RGB", 0, 1)
+    def resize(self, size, resample=Image.BILINEAR):
+        return PageImage.from_pil(self.to_pil().resize(size, resample))
+
+class TiledPageView:
+    """Draws a page onto a canvas as fixed-size tiles, rendering only those near the viewport"""
+    def __init__(self, canvas, cache, tile_size=512, margin=256):
+        self.canvas = canvas
+        self.cache = cache
+        self.tile_size = tile_size
+        self.margin = margin
+        self.page = None
+        self.tiles = {}
+        self.pending = []
+        self.after_id = None
+    @staticmethod
+    def needs_tiling(page, matrix, max_pixels=3000 * 3000):
+        rect = page.rect * matrix
+        return rect.width * rect.height > max_pixels
+    def show(self, page, matrix, base_key, postprocess=None):
+        """Lay out the page at full size and start filling in the visible tiles"""
+        self.clear()
+        self.page = page
+        self.matrix = matrix
+        self.base_key = base_key
+        self.postprocess = postprocess
+        self.bounds = page.rect * matrix
+        self.columns = int(self.bounds.width // self.tile_size) + 1
+        self.rows = int(self.bounds.height // self.tile_size) + 1
+        self.canvas.config(scrollregion=(0, 0, self.bounds.width, self.bounds.height))
+        self.refresh()
+    def clear(self):
+        if self.after_id:
+            self.canvas.after_cancel(self.after_id)
+            self.after_id = None
+        self.canvas.delete("tile")
+        self.tiles.clear()
+        self.pending = []
+        self.page = None
+    def visible_tiles(self):
+        left = self.canvas.canvasx(0) - self.margin
+        top = self.canvas.canvasy(0) - self.margin
+        right = self.canvas.canvasx(self.canvas.winfo_width()) + self.margin
+        bottom = self.canvas.canvasy(self.canvas.winfo_height()) + self.margin
+        columns = range(max(0, int(left // self.tile_size)), min(self.columns, int(right // self.tile_size) + 1))
+        rows = range(max(0, int(top // self.tile_size)), min(self.rows, int(bottom // self.tile_size) + 1))
+        center = ((left + right) / 2, (top + bottom) / 2)
+        tiles = [(column, row) for row in rows for column in columns]
+        return sorted(tiles, key=lambda t: abs((t[0] + 0.5) * self.tile_size - center[0]) + abs((t[1] + 0.5) * self.tile_size - center[1]))
+    def refresh(self):
+        """Drop tiles that scrolled away and queue the ones that came into view"""
+        if self.page is None:
+            return
+        wanted = self.visible_tiles()
+        wanted_set = set(wanted)
+        for tile in [t for t in self.tiles if t not in wanted_set]:
+            self.canvas.delete(self.tiles.pop(tile)[0])
+        self.pending = [t for t in wanted if t not in self.tiles]
+        if self.pending and self.after_id is None:
+            self.after_id = self.canvas.after(1, self.render_pending)
+    def render_pending(self):
+        self.after_id = None
+        deadline = time.perf_counter() + 0.03
+        while self.pending and time.perf_counter() < deadline:
+            self.attach_tile(self.pending.pop(0))
+        if self.pending:
+            self.after_id = self.canvas.after(1, self.render_pending)
+    def attach_tile(self, tile):
+        column, row = tile
+        key = self.base_key + tile
+        image = self.cache.get(key)
+        if image is None:
+            x0, y0 = self.bounds.x0 + column * self.tile_size, self.bounds.y0 + row * self.tile_size
+            tile_rect = fitz.Rect(x0, y0, x0 + self.tile_size, y0 + self.tile_size) & self.bounds
+            pix = self.page.get_pixmap(matrix=self.matrix, clip=tile_rect * ~self.matrix)
+            if self.postprocess:
+                self.postprocess(pix)
+            image = PageImage.from_pixmap(pix)
+            self.cache.put(key, image)
+        photo = image.photo()
+        item = self.canvas.create_image(column * self.tile_size, row * self.tile_size, anchor="nw", image=photo, tags=("tile",))
+        self.canvas.tag_lower(item)
+        self.tiles[tile] = (item, photo)
+
+class WriteBehindQueue:
+    """Applies persistence writes on a background thread.
+
+    Writes are keyed; a newer write for the same key replaces the pending one,
+    so a run of page turns costs a single write. The queue flushes once it has
+    been idle for ``delay`` seconds, at the latest ``max_delay`` seconds after
+    the first pending change, and on ``flush``/``close``.
+    """
+    def __init__(self, delay=1.0, max_delay=5.0):
+        self.delay = delay
+        self.max_delay = max_delay
+        self.pending = OrderedDict()
+        self.first_change = self.last_change = None
+        self.flush_requested = False
+        self.stopping = False
+        self.busy = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    def put(self, key, write):
+        """Queue ``write`` (a zero-argument callable), replacing any pending write for ``key``"""
+        with self.condition:
+            self.pending.pop(key, None)
+            self.pending[key] = write
+            now = time.monotonic()
+            if self.first_change is None:
+                self.first_change = now
+            self.last_change = now
+            self.condition.notify()
+    def due(self):
+        if self.flush_requested or self.stopping:
+            return 0
+        now = time.monotonic()
+        return max(0, min(self.last_change + self.delay, self.first_change + self.max_delay) - now)
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending or self.due() > 0:
+                    if self.stopping and not self.pending:
+                        return
+                    if self.flush_requested and not self.pending:
+                        self.flush_requested = False
+                    self.condition.wait(self.due() if self.pending else None)
+                batch = list(self.pending.values())
+                self.pending.clear()
+                self.first_change = self.last_change = None
+                self.busy = True
+            for write in batch:
+                try:
+                    write()
+                except Exception as e:
+                    print(f"Error writing data: {e}")
+            with self.condition:
+                self.busy = False
+                if not self.pending:
+                    self.flush_requested = False
+                self.condition.notify_all()
+    def flush(self, timeout=None):
+        """Write everything pending now and wait until it is on disk"""
+        with self.condition:
+            if not self.pending and not self.busy:
+                return
+            self.flush_requested = True
+            self.condition.notify_all()
+            self.condition.wait_for(lambda: not self.pending and not self.busy, timeout)
+    def close(self, timeout=None):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self.thread.join(timeout)
+
+def write_json_atomic(path, data):
+    """Replace ``path`` with ``data`` as JSON via a temporary file, so a crash never leaves it half written"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(data, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+def parse_page_ranges(spec, page_count):
+    """Turn a 1-based spec such as "1-50,75,100-" into sorted 0-based page numbers"""
+    pages = set()
+    for part in spec.replace(' ', '').split(','):
+        if not part:
+            continue
+        start, dash, end = part.partition('-')
+        first = int(start) if start else 1
+        last = (int(end) if end else page_count) if dash else first
+        if first < 1 or last > page_count or first > last:
+            raise ValueError(f"Page range {part!r} is outside 1-{page_count}")
+        pages.update(range(first - 1, last))
+    return sorted(pages)
+
+XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+class StreamingDocxWriter:
+    """Writes a minimal .docx one paragraph at a time, so the document body is never held in memory"""
+    CONTENT_TYPES = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '</Types>')
+    RELATIONSHIPS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+        '</Relationships>')
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        self.archive.writestr('[Content_Types].xml', self.CONTENT_TYPES)
+        self.archive.writestr('_rels/.rels', self.RELATIONSHIPS)
+        self.body = self.archive.open('word/document.xml', 'w')
+        self.body.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            b'<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>')
+    def add_paragraph(self, text):
+        text = xml_escape(XML_INVALID.sub('', text))
+        self.body.write(f'<w:p><w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p>'.encode('utf-8'))
+    def add_page_break(self):
+        self.body.write(b'<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+    def close(self):
+        self.body.write(b'</w:body></w:document>')
+        self.body.close()
+        self.archive.close()
+
+def render_pages_to_files(file_path, targets, dpi):
+    """Render (page_num, path) pairs at dpi with a private fitz handle; runs in a worker process"""
+    with fitz.open(file_path) as document:
+        for page_num, path in targets:
+            pix = document[page_num].get_pixmap(dpi=dpi)
+            if path.lower().endswith('.png'):
+                pix.save(path)
+            else:
+                PageImage.from_pixmap(pix).to_pil().save(path)
+    return len(targets)
+
+def run_chunks(function, file_path, chunks, args=(), max_workers=None, cancelled=None, ordered=True):
+    """Run function(file_path, chunk, *args) for each chunk in worker processes, yielding (chunk, result).
+
+    Results come in chunk order, or as each finishes when ordered is false. A single chunk or a
+    single worker runs in this process. Nothing more is yielded once cancelled is set.
+    """
+    if len(chunks) <= 1 or max_workers == 1:
+        for chunk in chunks:
+            if cancelled and cancelled.is_set():
+                return
+            yield chunk, function(file_path, chunk, *args)
+        return
+    with ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count() or 1, len(chunks))) as executor:
+        futures = {executor.submit(function, file_path, chunk, *args): chunk for chunk in chunks}
+        try:
+            for future in futures if ordered else as_completed(futures):
+                if cancelled and cancelled.is_set():
+                    return
+                yield futures[future], future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+_worker_documents = {}
+
+def worker_document(file_path):
+    """An open fitz document for file_path, kept between calls in a worker process and reopened if the file changes"""
+    key = (file_path, os.path.getmtime(file_path))
+    document = _worker_documents.get(key)
+    if document is None:
+        for other in _worker_documents.values():
+            other.close()
+        _worker_documents.clear()
+        document = _worker_documents[key] = fitz.open(file_path)
+    return document
+
+def page_chunks(pages, max_workers=None, min_chunk=16):
+    """Split pages into about four chunks per worker, each at least min_chunk pages long"""
+    chunk_size = max(min_chunk, len(pages) // ((max_workers or os.cpu_count() or 1) * 4) + 1)
+    return [pages[i:i + chunk_size] for i in range(0, len(pages), chunk_size)]
+
+def extract_pages(file_path, page_numbers, with_words=True):
+    """Extract (page_num, text, words) for a run of pages using a private fitz handle"""
+    results = []
+    with fitz.open(file_path) as document:
+        for page_num in page_numbers:
+            page = document[page_num]
+            words = [tuple(word) for word in page.get_text("words")] if with_words else None
+            results.append((page_num, page.get_text(), words))
+    return results
+
+class TextExtractionPool:
+    """Splits a page range across worker processes, each extracting text and word boxes with its own fitz handle"""
+    def __init__(self, max_workers=None, min_pages_per_worker=16):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_pages_per_worker = min_pages_per_worker
+    def chunks(self, pages):
+        return page_chunks(pages, self.max_workers, self.min_pages_per_worker)
+    def iter_pages(self, file_path, pages=None, with_words=True, cancelled=None, ordered=False):
+        """Yield (page_num, text, words), in page order if ordered, otherwise as chunks finish"""
+        if pages is None:
+            with fitz.open(file_path) as document:
+                pages = range(len(document))
+        for _, results in run_chunks(extract_pages, file_path, self.chunks(list(pages)), (with_words,), self.max_workers, cancelled, ordered):
+            yield from results
+    def extract(self, file_path, pages=None, with_words=True):
+        """Return {page_num: (text, words)} for the requested pages"""
+        return {page_num: (text, words) for page_num, text, words in self.iter_pages(file_path, pages, with_words)}
+
+def export_pages(file_path, pages, save_path, dpi=150, progress=None, cancelled=None, max_workers=None, chunk_size=8, export_format=None):
+    """Export pages to save_path in export_format, by default the format given by its extension.
+
+    PNG/JPG write one image per page (numbered files for more than one page); TXT, DOCX
+    and PDF write a single file that only replaces save_path once the export completes.
+    TXT separates pages with a form feed and DOCX with a page break.
+    Returns the number of pages exported, which is short of len(pages) if cancelled.
+    """
+    ext = f".{export_format}" if export_format else os.path.splitext(save_path)[1].lower()
+    done = 0
+    def advance(count):
+        nonlocal done
+        done += count
+        if progress:
+            progress(done, len(pages))
+    if ext in ('.png', '.jpg'):
+        if len(pages) == 1:
+            targets = [(pages[0], save_path)]
+        else:
+            base = os.path.splitext(save_path)[0]
+            targets = [(page_num, f"{base}-{page_num + 1:04d}{ext}") for page_num in pages]
+        chunks = [targets[i:i + chunk_size] for i in range(0, len(targets), chunk_size)]
+        for _, count in run_chunks(render_pages_to_files, file_path, chunks, (dpi,), max_workers, cancelled):
+            advance(count)
+        return done
+    temp_path = save_path + '.part'
+    try:
+        if ext == '.pdf':
+            runs = []
+            for page_num in pages:
+                if runs and page_num == runs[-1][1] + 1 and runs[-1][1] - runs[-1][0] < chunk_size * 4:
+                    runs[-1][1] = page_num
+                else:
+                    runs.append([page_num, page_num])
+            with fitz.open(file_path) as document, fitz.open() as output:
+                for first, last in runs:
+                    if cancelled and cancelled.is_set():
+                        return done
+                    output.insert_pdf(document, from_page=first, to_page=last)
+                    advance(last - first + 1)
+                output.save(temp_path)
+        elif ext in ('.txt', '.docx'):
+            writer = StreamingDocxWriter(temp_path) if ext == '.docx' else open(temp_path, 'w', encoding='utf-8')
+            written = 0
+            try:
+                for page_num, text, _ in TextExtractionPool(max_workers, chunk_size * 4).iter_pages(file_path, pages, False, cancelled, ordered=True):
+                    if ext == '.docx':
+                        if written:
+                            writer.add_page_break()
+                        for line in text.splitlines():
+                            writer.add_paragraph(line)
+                    else:
+                        if written:
+                            writer.write('\f')
+                        writer.write(text)
+                    written += 1
+                    advance(1)
+            finally:
+                writer.close()
+        else:
+            raise ValueError(f"Unsupported export format {ext!r}")
+        if done == len(pages):
+            os.replace(temp_path, save_path)
+        return done
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,21 @@
+import os
+import sys
+import fitz
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_pdf(path, pages):
+    """Write a PDF whose pages hold the given lines of text"""
+    document = fitz.open()
+    for lines in pages:
+        page = document.new_page()
+        for number, line in enumerate(lines):
+            page.insert_text((72, 72 + 14 * number), line)
+    document.save(path)
+    document.close()
+    return str(path)
+
+@pytest.fixture
+def sample_pdf(tmp_path):
+    return make_pdf(tmp_path / "sample.pdf", [[f"Page {number + 1}"] for number in range(40)])
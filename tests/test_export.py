@@ -0,0 +1,44 @@
+import zipfile
+import fitz
+import pytest
+from readify_core import export_pages, parse_page_ranges
+
+def test_parse_page_ranges():
+    assert parse_page_ranges("1-3,5", 10) == [0, 1, 2, 4]
+    assert parse_page_ranges("8-", 10) == [7, 8, 9]
+    assert parse_page_ranges("-2, 2", 10) == [0, 1]
+    assert parse_page_ranges("3,1", 10) == [0, 2]
+
+@pytest.mark.parametrize("spec", ["0", "11", "5-3", "2-12"])
+def test_parse_page_ranges_rejects_out_of_range(spec):
+    with pytest.raises(ValueError):
+        parse_page_ranges(spec, 10)
+
+@pytest.mark.parametrize("count", [1, 5, 40])
+def test_txt_pages_are_separated_by_form_feeds(sample_pdf, tmp_path, count):
+    save_path = str(tmp_path / "out.txt")
+    assert export_pages(sample_pdf, list(range(count)), save_path, max_workers=1) == count
+    pages = open(save_path, encoding='utf-8').read().split('\f')
+    assert [page.strip() for page in pages] == [f"Page {number + 1}" for number in range(count)]
+
+@pytest.mark.parametrize("count", [1, 5, 40])
+def test_docx_has_one_page_break_between_pages(sample_pdf, tmp_path, count):
+    save_path = str(tmp_path / "out.docx")
+    export_pages(sample_pdf, list(range(count)), save_path, max_workers=1)
+    body = zipfile.ZipFile(save_path).read('word/document.xml')
+    assert body.count(b'w:type="page"') == count - 1
+    assert body.count(b'Page ') == count
+
+def test_pdf_export_keeps_selected_pages(sample_pdf, tmp_path):
+    save_path = str(tmp_path / "out.pdf")
+    export_pages(sample_pdf, [0, 1, 2, 9, 30], save_path)
+    with fitz.open(save_path) as document:
+        assert [page.get_text().strip() for page in document] == ["Page 1", "Page 2", "Page 3", "Page 10", "Page 31"]
+
+def test_cancelled_export_leaves_nothing_behind(sample_pdf, tmp_path):
+    class Cancelled:
+        def is_set(self):
+            return True
+    save_path = tmp_path / "out.txt"
+    assert export_pages(sample_pdf, list(range(40)), str(save_path), cancelled=Cancelled(), max_workers=1) == 0
+    assert list(tmp_path.iterdir()) == [tmp_path / "sample.pdf"]
@@ -0,0 +1,69 @@
+import os
+import threading
+import pytest
+import readify
+from readify import LibraryCatalog, LibraryScanner
+from conftest import make_pdf
+
+@pytest.fixture
+def library(tmp_path):
+    root = tmp_path / "books"
+    (root / "a").mkdir(parents=True)
+    (root / "b").mkdir()
+    (root / "a" / "one.txt").write_text("first book")
+    (root / "a" / "two.txt").write_text("second book")
+    (root / "b" / "three.txt").write_text("third book")
+    make_pdf(root / "b" / "four.pdf", [["a pdf page"]])
+    (root / "b" / "skipped.epub").write_text("not catalogued")
+    return root
+
+def scan(library, tmp_path, cancelled=None):
+    return LibraryScanner([str(library)], str(tmp_path / "catalog.db"), max_workers=1, cancelled=cancelled).scan()
+
+def catalogued(tmp_path):
+    catalog = LibraryCatalog(str(tmp_path / "catalog.db"))
+    try:
+        return sorted(os.path.basename(path) for path in catalog.known_files())
+    finally:
+        catalog.close()
+
+def test_first_scan_catalogues_supported_files(library, tmp_path):
+    stats = scan(library, tmp_path)
+    assert (stats['files'], stats['added'], stats['removed'], stats['errors']) == (4, 4, 0, 0)
+    assert catalogued(tmp_path) == ["four.pdf", "one.txt", "three.txt", "two.txt"]
+
+def test_rescan_only_reads_changed_files(library, tmp_path):
+    scan(library, tmp_path)
+    assert scan(library, tmp_path)['unchanged'] == 4
+    os.utime(library / "a" / "one.txt", (1, 1))
+    (library / "a" / "two.txt").write_text("second book, revised")
+    (library / "b" / "three.txt").unlink()
+    (library / "a" / "five.txt").write_text("fifth book")
+    stats = scan(library, tmp_path)
+    assert (stats['touched'], stats['updated'], stats['added'], stats['removed'], stats['unchanged']) == (1, 1, 1, 1, 1)
+    assert catalogued(tmp_path) == ["five.txt", "four.pdf", "one.txt", "two.txt"]
+
+def test_cancelled_scan_keeps_existing_rows(library, tmp_path, monkeypatch):
+    scan(library, tmp_path)
+    cancelled = threading.Event()
+    scandir = os.scandir
+    def scandir_then_cancel(path):
+        cancelled.set()
+        return scandir(path)
+    monkeypatch.setattr(readify.os, "scandir", scandir_then_cancel)
+    stats = scan(library, tmp_path, cancelled)
+    assert stats['cancelled'] and stats['removed'] == 0
+    assert len(catalogued(tmp_path)) == 4
+
+def test_unreadable_directory_keeps_its_rows(library, tmp_path, monkeypatch):
+    scan(library, tmp_path)
+    scandir = os.scandir
+    def failing_scandir(path):
+        if os.path.basename(path) == "b":
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+    monkeypatch.setattr(readify.os, "scandir", failing_scandir)
+    (library / "a" / "one.txt").unlink()
+    stats = scan(library, tmp_path)
+    assert stats['removed'] == 1
+    assert catalogued(tmp_path) == ["four.pdf", "three.txt", "two.txt"]
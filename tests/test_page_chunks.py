@@ -0,0 +1,27 @@
+import threading
+from readify_core import extract_pages, page_chunks, run_chunks, TextExtractionPool
+
+def test_page_chunks_cover_every_page_once():
+    pages = list(range(1000))
+    chunks = page_chunks(pages, max_workers=4, min_chunk=16)
+    assert [p for chunk in chunks for p in chunk] == pages
+    assert len(chunks) <= 17
+    assert page_chunks(list(range(10)), max_workers=4, min_chunk=16) == [list(range(10))]
+
+def test_run_chunks_yields_in_chunk_order_from_worker_processes(sample_pdf):
+    chunks = page_chunks(list(range(40)), max_workers=2, min_chunk=4)
+    results = list(run_chunks(extract_pages, sample_pdf, chunks, (False,), max_workers=2))
+    assert [chunk for chunk, _ in results] == chunks
+    assert [text.strip() for _, pages in results for _, text, _ in pages] == [f"Page {n + 1}" for n in range(40)]
+
+def test_run_chunks_unordered_still_returns_everything(sample_pdf):
+    pages = TextExtractionPool(2, 4).iter_pages(sample_pdf, range(40), with_words=False)
+    assert sorted(page_num for page_num, _, _ in pages) == list(range(40))
+
+def test_run_chunks_stops_once_cancelled(sample_pdf):
+    cancelled = threading.Event()
+    seen = []
+    for chunk, _ in run_chunks(extract_pages, sample_pdf, [[0], [1], [2]], (False,), max_workers=1, cancelled=cancelled):
+        seen.append(chunk)
+        cancelled.set()
+    assert seen == [[0]]
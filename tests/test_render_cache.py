@@ -0,0 +1,41 @@
+from readify_core import PageImage, PageRenderCache
+
+def image(size):
+    return PageImage(1, 1, b'x' * size)
+
+def test_least_recently_used_pages_are_evicted_first():
+    cache = PageRenderCache(max_bytes=300)
+    for page in range(3):
+        cache.put((page, 1.0, 0, 'light'), image(100))
+    assert cache.get((0, 1.0, 0, 'light')) is not None
+    cache.put((3, 1.0, 0, 'light'), image(100))
+    assert (1, 1.0, 0, 'light') not in cache
+    assert all((page, 1.0, 0, 'light') in cache for page in (0, 2, 3))
+    assert cache.stats()['bytes'] == 300
+
+def test_ceiling_is_in_bytes_not_entries():
+    cache = PageRenderCache(max_bytes=1000)
+    cache.put('small', image(100))
+    cache.put('large', image(950))
+    assert 'small' not in cache and 'large' in cache
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'entries': 1, 'bytes': 950}
+
+def test_image_larger_than_the_ceiling_is_not_cached():
+    cache = PageRenderCache(max_bytes=100)
+    cache.put('kept', image(50))
+    cache.put('huge', image(101))
+    assert 'huge' not in cache and 'kept' in cache
+
+def test_replacing_a_key_keeps_the_byte_count_right():
+    cache = PageRenderCache(max_bytes=1000)
+    cache.put('page', image(400))
+    cache.put('page', image(100))
+    assert cache.stats()['bytes'] == 100 and cache.stats()['entries'] == 1
+
+def test_hits_misses_and_clear():
+    cache = PageRenderCache()
+    cache.put('page', image(10))
+    assert cache.get('page').data == b'x' * 10
+    assert cache.get('other') is None
+    cache.clear()
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 0, 'bytes': 0}
@@ -0,0 +1,71 @@
+import re
+import pytest
+from readify import LineIndexedFile, TextSearchEngine, compile_search_pattern
+
+TEXT = ("Grüße aus Köln. The word crème brûlée sits across chunk edges; "
+        "so does ÆØÅ and the_word inside wordplay. " * 7) + "word"
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "text.txt"
+    path.write_bytes(TEXT.encode('utf-8'))
+    source = LineIndexedFile(str(path))
+    yield source
+    source.close()
+
+def expected(term, case_sensitive=False, whole_word=False, regex=False):
+    """Byte offsets of every match, found by decoding the whole text at once"""
+    hits = []
+    for match in compile_search_pattern(term, case_sensitive, whole_word, regex).finditer(TEXT):
+        start = len(TEXT[:match.start()].encode('utf-8'))
+        hits.append((start, start + len(match.group().encode('utf-8'))))
+    return hits
+
+@pytest.mark.parametrize("chunk_size", [7, 16, 33, 1 << 20])
+@pytest.mark.parametrize("query", [
+    ("crème", False, False, False),
+    ("ÆØÅ", False, False, False),
+    ("brûlée sits", False, False, False),
+    ("k[öo]ln", False, False, True),
+    ("GRÜSSE|grüße", True, False, True),
+    ("wörd|word", False, True, True),
+])
+def test_decoded_search_finds_every_match_once_across_chunk_edges(source, chunk_size, query):
+    engine = TextSearchEngine(source, chunk_size=chunk_size, overlap=16, context=8)
+    assert list(engine.search(*query)) == expected(*query)
+
+@pytest.mark.parametrize("query", [
+    ("word", False, False, False),
+    ("word", False, True, False),
+    ("WORD", True, False, False),
+    ("the   word", False, False, False),
+    ("aus", False, True, False),
+])
+def test_ascii_search_on_the_map_matches_the_decoded_search(source, query):
+    assert list(TextSearchEngine(source).search(*query)) == expected(*query)
+
+@pytest.mark.parametrize("chunk_size", [7, 8, 16, 1 << 20])
+def test_self_overlapping_matches_stay_aligned_across_chunks(tmp_path, chunk_size):
+    text = "é" + "a" * 50
+    path = tmp_path / "run.txt"
+    path.write_bytes(text.encode('utf-8'))
+    source = LineIndexedFile(str(path))
+    try:
+        hits = list(TextSearchEngine(source, chunk_size=chunk_size, overlap=16, context=8).search("aa", regex=True))
+    finally:
+        source.close()
+    assert hits == [(match.start() + 1, match.end() + 1) for match in re.finditer("aa", text)]
+
+def test_offsets_point_at_the_matched_bytes(source):
+    for start, end in TextSearchEngine(source, chunk_size=16, overlap=16, context=8).search("brûlée"):
+        assert source.decode(start, end) == "brûlée"
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    source = LineIndexedFile(str(path))
+    try:
+        assert list(TextSearchEngine(source).search("word")) == []
+        assert list(TextSearchEngine(source).search("wörd")) == []
+    finally:
+        source.close()
@@ -0,0 +1,44 @@
+import pytest
+from readify import LineIndexedFile
+
+@pytest.fixture
+def open_text(tmp_path):
+    files = []
+    def open_text(data):
+        path = tmp_path / f"text{len(files)}.txt"
+        path.write_bytes(data)
+        files.append(LineIndexedFile(str(path)))
+        return files[-1]
+    yield open_text
+    for source in files:
+        source.close()
+
+def test_line_starts(open_text):
+    source = open_text(b"one\ntwo\n\nfour")
+    assert list(source.line_starts) == [0, 4, 8, 9]
+    assert source.line_count == 4
+    assert source.read_lines(1, 3) == "two\n\n"
+    assert source.line_start(10) == source.size
+
+def test_trailing_newline_does_not_add_a_line(open_text):
+    source = open_text(b"one\ntwo\n")
+    assert source.line_count == 2
+    assert source.read_lines(0, 2) == "one\ntwo\n"
+
+def test_crlf_is_read_as_lf(open_text):
+    source = open_text(b"one\r\ntwo\r\n")
+    assert source.line_count == 2
+    assert source.read_lines(0, 2) == "one\ntwo\n"
+
+def test_empty_file(open_text):
+    source = open_text(b"")
+    assert source.line_count == 1
+    assert source.read_lines(0, 1) == ""
+
+def test_offsets_and_columns_count_characters(open_text):
+    source = open_text("naïve\ncafé crème\n".encode('utf-8'))
+    offset = len("naïve\ncafé ".encode('utf-8'))
+    assert source.line_of(offset) == 1
+    assert source.line_col(offset) == (1, 5)
+    assert source.offset_of(1, 5) == offset
+    assert source.offset_of(99, 0) == source.line_start(1)
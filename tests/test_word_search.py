@@ -0,0 +1,45 @@
+import fitz
+import pytest
+from readify import compile_search_pattern, iter_word_matches, search_page
+
+@pytest.fixture
+def page():
+    document = fitz.open()
+    page = document.new_page()
+    page.insert_text((72, 100), "Ein Wimmelbild illustriert billige Fische", fontsize=14)
+    page.insert_text((72, 130), "banana split, office hours and WIDTH widths", fontsize=11, fontname="tiro")
+    yield page
+    document.close()
+
+def assert_same_rects(found, expected):
+    assert len(found) == len(expected)
+    for rect, other in zip(sorted(found, key=lambda r: (r.y0, r.x0)), sorted(expected, key=lambda r: (r.y0, r.x0))):
+        assert rect.x0 == pytest.approx(other.x0, abs=0.5)
+        assert rect.x1 == pytest.approx(other.x1, abs=0.5)
+
+@pytest.mark.parametrize("term", ["mm", "ill", "Fisch", "ana", "ice", "dth"])
+def test_partial_word_hits_match_search_for(page, term):
+    hits = [rect for _, rect in search_page(page, 0, compile_search_pattern(term))]
+    assert_same_rects(hits, page.search_for(term))
+
+def test_whole_word_hits_use_word_boxes(page):
+    words = page.get_text("words")
+    hits = list(iter_word_matches(words, compile_search_pattern("billige", whole_word=True), page))
+    box = next(fitz.Rect(word[:4]) for word in words if word[4] == "billige")
+    assert [tuple(rect) for _, rect in hits] == [tuple(box)]
+
+def test_phrase_spans_words_and_lines(page):
+    hits = list(iter_word_matches(page.get_text("words"), compile_search_pattern("Wimmelbild  illustriert")))
+    assert len(hits) == 1
+    assert hits[0][0].group() == "Wimmelbild illustriert"
+    assert_same_rects([hits[0][1]], page.search_for("Wimmelbild illustriert"))
+
+def test_whole_word_skips_partial_matches(page):
+    hits = list(iter_word_matches(page.get_text("words"), compile_search_pattern("width", whole_word=True), page))
+    assert [match.group() for match, _ in hits] == ["WIDTH"]
+
+def test_without_page_partial_hits_stay_inside_the_word(page):
+    words = page.get_text("words")
+    (match, rect), = iter_word_matches(words, compile_search_pattern("mm"))
+    box = next(fitz.Rect(word[:4]) for word in words if word[4] == "Wimmelbild")
+    assert box.contains(rect)
@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+from readify_core import WriteBehindQueue, write_json_atomic
+
+def recorder():
+    writes = []
+    written = threading.Event()
+    def write(value):
+        def apply():
+            writes.append((value, time.monotonic()))
+            written.set()
+        return apply
+    return writes, written, write
+
+def test_writes_for_the_same_key_are_coalesced():
+    writes, written, write = recorder()
+    queue = WriteBehindQueue(delay=0.05, max_delay=1.0)
+    try:
+        for page in range(10):
+            queue.put('position', write(page))
+        assert written.wait(1.0)
+        time.sleep(0.1)
+        assert [value for value, _ in writes] == [9]
+    finally:
+        queue.close()
+
+def test_write_waits_for_the_queue_to_go_idle():
+    writes, written, write = recorder()
+    queue = WriteBehindQueue(delay=0.2, max_delay=5.0)
+    try:
+        start = time.monotonic()
+        queue.put('position', write(1))
+        assert written.wait(2.0)
+        assert writes[0][1] - start >= 0.19
+    finally:
+        queue.close()
+
+def test_max_delay_bounds_a_continuous_stream():
+    writes, written, write = recorder()
+    queue = WriteBehindQueue(delay=0.2, max_delay=0.3)
+    try:
+        start = time.monotonic()
+        while not written.is_set() and time.monotonic() - start < 2.0:
+            queue.put('position', write(time.monotonic()))
+            time.sleep(0.02)
+        assert written.is_set()
+        assert writes[0][1] - start < 0.45
+    finally:
+        queue.close()
+
+def test_flush_writes_pending_changes_at_once():
+    writes, _, write = recorder()
+    queue = WriteBehindQueue(delay=10.0, max_delay=10.0)
+    try:
+        queue.put('a', write('a'))
+        queue.put('b', write('b'))
+        queue.flush(timeout=1.0)
+        assert [value for value, _ in writes] == ['a', 'b']
+    finally:
+        queue.close()
+
+def test_empty_flush_does_not_disable_the_debounce():
+    writes, written, write = recorder()
+    queue = WriteBehindQueue(delay=0.2, max_delay=5.0)
+    try:
+        queue.flush(timeout=1.0)
+        start = time.monotonic()
+        queue.put('position', write(1))
+        assert written.wait(2.0)
+        assert writes[0][1] - start >= 0.19
+    finally:
+        queue.close()
+
+def test_close_writes_what_is_pending():
+    writes, _, write = recorder()
+    queue = WriteBehindQueue(delay=10.0, max_delay=10.0)
+    queue.put('position', write(3))
+    queue.close(timeout=1.0)
+    assert [value for value, _ in writes] == [3]
+
+def test_write_json_atomic_replaces_the_file(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text("old")
+    write_json_atomic(str(path), {'page': 4})
+    assert json.loads(path.read_text()) == {'page': 4}
+    assert [p.name for p in tmp_path.iterdir()] == ["data.json"]
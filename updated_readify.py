@@ -2,15 +2,142 @@ import customtkinter as ctk
 import fitz 
 from tkinter import filedialog, messagebox, ttk
 import os
-from docx import Document
 from fpdf import FPDF
 import json
-from PIL import Image, ImageTk
 import io
 import ctypes
 import tkinter as tk 
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from readify_core import PageRenderCache, PageImage, TiledPageView, WriteBehindQueue, write_json_atomic, parse_page_ranges, export_pages, worker_document
+def render_page_pixmap(document, page_num, zoom_level, rotation):
+    zoom_matrix = fitz.Matrix(zoom_level * 1.5, zoom_level * 1.5).prerotate(rotation)
+    return document[page_num].get_pixmap(matrix=zoom_matrix)
+def apply_dark_mode(page, pix, zoom_level, rotation, smart=False):
+    """Invert the pixmap in place; smart mode restores embedded images afterwards"""
+    pix.invert_irect(pix.irect)
+    if smart:
+        zoom_matrix = fitz.Matrix(zoom_level * 1.5, zoom_level * 1.5).prerotate(rotation)
+        for info in page.get_image_info():
+            image_rect = (fitz.Rect(info["bbox"]) * zoom_matrix).irect & pix.irect
+            if not image_rect.is_empty:
+                pix.invert_irect(image_rect)
+def render_page_image(document, page_num, zoom_level, rotation, theme):
+    """Render a page for display, returning the image and its timings in ms"""
+    start = time.perf_counter()
+    pix = render_page_pixmap(document, page_num, zoom_level, rotation)
+    rendered = time.perf_counter()
+    if theme in ("dark", "smart-dark"):
+        apply_dark_mode(document[page_num], pix, zoom_level, rotation, smart=theme == "smart-dark")
+    inverted = time.perf_counter()
+    img = PageImage.from_pixmap(pix)
+    timing = {"render_ms": (rendered - start) * 1000, "dark_mode_ms": (inverted - rendered) * 1000, "total_ms": (time.perf_counter() - start) * 1000}
+    return img, timing
+def render_page_image_file(file_path, page_num, zoom_level, rotation, theme):
+    """render_page_image for a worker process, which keeps the document open between pages"""
+    return render_page_image(worker_document(file_path), page_num, zoom_level, rotation, theme)
+class RenderScheduler:
+    """Renders only the newest requested page state in a worker process.
+
+    PyMuPDF holds the GIL while it rasterizes, so a coordinator thread hands each
+    render to a single-process pool and waits for it there instead. Requests arriving
+    while a render is running replace the pending one, and results for anything but
+    the latest request are dropped instead of shown.
+    """
+    def __init__(self, window, on_done):
+        self.window = window
+        self.on_done = on_done
+        self.pending = None
+        self.generation = 0
+        self.running = True
+        self.executor = ProcessPoolExecutor(max_workers=1)
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    def submit(self, file_path, page_num, zoom_level, rotation, theme):
+        with self.condition:
+            self.pending = (file_path, page_num, zoom_level, rotation, theme)
+            self.generation += 1
+            self.condition.notify()
+    def cancel(self):
+        with self.condition:
+            self.pending = None
+            self.generation += 1
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.pending = None
+            self.generation += 1
+            self.condition.notify()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                state, generation = self.pending, self.generation
+                self.pending = None
+            file_path, page_num, zoom_level, rotation, theme = state
+            try:
+                img, timing = self.executor.submit(render_page_image_file, *state).result()
+            except Exception as e:
+                print(f"Error rendering page {page_num + 1}: {e}")
+                continue
+            if generation == self.generation:
+                self.window.after(0, self.deliver, generation, state, img, timing)
+    def deliver(self, generation, state, img, timing):
+        if generation == self.generation:
+            self.on_done(state, img, timing)
+class ExportJob:
+    """Runs export_pages on a background thread, reporting throttled progress and completion on the Tk thread"""
+    def __init__(self, window, file_path, pages, save_path, dpi, on_progress, on_done, progress_interval=0.1):
+        self.window = window
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.progress_interval = progress_interval
+        self.last_progress = 0
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(file_path, pages, save_path, dpi), daemon=True)
+        self.thread.start()
+    def cancel(self):
+        self.cancelled.set()
+    def progress(self, done, total):
+        now = time.perf_counter()
+        if now - self.last_progress >= self.progress_interval or done == total:
+            self.last_progress = now
+            self.window.after(0, self.on_progress, done, total)
+    def run(self, file_path, pages, save_path, dpi):
+        error, done = None, 0
+        try:
+            done = export_pages(file_path, pages, save_path, dpi, self.progress, self.cancelled)
+        except Exception as e:
+            error = e
+        self.window.after(0, self.on_done, done, len(pages), error)
+class BoxGrid:
+    """Uniform grid over rectangles for point hit-testing; each cell lists the boxes that overlap it"""
+    def __init__(self, boxes, cell_size=None):
+        self.boxes = boxes
+        if cell_size is None:
+            heights = sorted(y1 - y0 for x0, y0, x1, y1 in boxes) or [0]
+            cell_size = max(16, 2 * heights[len(heights) // 2])
+        self.cell_size = cell_size
+        self.cells = {}
+        for index, (x0, y0, x1, y1) in enumerate(boxes):
+            for column in range(int(x0 // cell_size), int(x1 // cell_size) + 1):
+                for row in range(int(y0 // cell_size), int(y1 // cell_size) + 1):
+                    self.cells.setdefault((column, row), []).append(index)
+    def hit(self, x, y):
+        """Index of the first box containing (x, y), or None"""
+        for index in self.cells.get((int(x // self.cell_size), int(y // self.cell_size)), ()):
+            x0, y0, x1, y1 = self.boxes[index]
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                return index
+        return None
 class EbookReader:
-    def __init__(self):
+    def __init__(self, render_cache_bytes=256 * 1024 * 1024):
         self.window = ctk.CTk()
         self.window.title("Readify")
         self.window.geometry("1200x800")
@@ -19,17 +146,25 @@ class EbookReader:
         self.current_page = 0
         self.total_pages = 0
         self.current_image = None
+        self.displayed_page = None
         self.zoom_level = 1.0
         self.current_rotation = 0
         self.bookmarks = {}
         self.search_boxes = []
+        self.search_grid = None
+        self.hover_position = (0, 0)
+        self.hover_after_id = None
+        self.hover_interval = 16
         self.current_highlight = None
         self.theme = "light"
+        self.smart_dark_mode = False
         self.search_index = -1
         self.search_history = [] 
         self.preferences = {'reading_position': {}}  
         self.pdf_document = None 
-        self.original_page_pixmap = None
+        self.render_cache = PageRenderCache(render_cache_bytes)
+        self.render_scheduler = RenderScheduler(self.window, self.on_page_rendered)
+        self.writer = WriteBehindQueue()
         self.create_menu_bar()
         self.setup_ui()
         self.load_bookmarks()
@@ -50,6 +185,13 @@ class EbookReader:
             ctk.set_appearance_mode("light")
             self.canvas.config(bg="white")
         self.display_page()
+    def toggle_smart_dark_mode(self):
+        self.smart_dark_mode = not self.smart_dark_mode
+        self.display_page()
+    def page_theme(self):
+        if self.theme == "dark" and self.smart_dark_mode:
+            return "smart-dark"
+        return self.theme
     def setup_keyboard_shortcuts(self):
         self.root = self.window 
         self.root.bind('<Control-f>', lambda e: self.focus_search())
@@ -143,6 +285,10 @@ class EbookReader:
         self.canvas = ctk.CTkCanvas(self.canvas_frame, bg="white", highlightthickness=0)
         self.canvas.pack(fill="both", expand=True)
         self.canvas.bind("<Motion>", self.check_highlight_hover)
+        self.canvas.bind("<MouseWheel>", self.handle_mousewheel)
+        self.tile_view = TiledPageView(self.canvas, self.render_cache)
+        self.canvas.config(yscrollcommand=lambda *args: self.tile_view.refresh(), xscrollcommand=lambda *args: self.tile_view.refresh())
+        self.canvas.bind("<Configure>", lambda event: self.tile_view.refresh())
     def zoom_in(self):
         self.zoom_level *= 1.2
         self.zoom_label.configure(text=f"{int(self.zoom_level * 100)}%")
@@ -160,35 +306,72 @@ class EbookReader:
             print(f"Error loading bookmarks: {e}")
             self.bookmarks = {}
     def save_bookmarks(self):
-        try:
-            with open("bookmarks.json", "w") as f:
-                json.dump(self.bookmarks, f)
-        except Exception as e:
-            print(f"Error saving bookmarks: {e}")
+        # Page entries are replaced rather than mutated, so copying two levels is a stable snapshot
+        snapshot = {file_path: dict(pages) for file_path, pages in self.bookmarks.items()}
+        self.writer.put("bookmarks.json", lambda: write_json_atomic("bookmarks.json", snapshot))
     def open_file(self):
         file_path = filedialog.askopenfilename(filetypes=[("All supported files", "*.txt *.pdf"),("Text files", "*.txt"),("PDF files", "*.pdf"),("All files", "*.*") ])
         if file_path:
             self.current_file = fitz.open(file_path)
             self.current_file_path = file_path
+            self.render_cache.clear()
+            self.displayed_page = None
             self.total_pages = len(self.current_file)
             self.current_page = 0
             self.display_page()
             self.update_bookmarks_display()
     def display_page(self):
         if self.current_file:
-            self.canvas.delete("all")
-            self.search_boxes = []
-            page = self.current_file[self.current_page]
-            zoom_matrix = fitz.Matrix(self.zoom_level * 1.5, self.zoom_level * 1.5)
-            pix = page.get_pixmap(matrix=zoom_matrix)
-            self.original_page_pixmap = pix
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            if self.theme == "dark":
-                img = Image.eval(img, lambda x: 255 - x) 
-            self.current_image = ImageTk.PhotoImage(img)
-            self.canvas.config(scrollregion=(0, 0, pix.width, pix.height))
-            self.canvas.create_image(0, 0, anchor="nw", image=self.current_image)
             self.page_label.configure(text=f"Page: {self.current_page + 1}/{self.total_pages}")
+            key = (self.current_page, round(self.zoom_level, 4), self.current_rotation, self.page_theme())
+            page = self.current_file[self.current_page]
+            zoom_matrix = fitz.Matrix(self.zoom_level * 1.5, self.zoom_level * 1.5).prerotate(self.current_rotation)
+            if TiledPageView.needs_tiling(page, zoom_matrix):
+                self.render_scheduler.cancel()
+                self.canvas.delete("all")
+                self.search_boxes = []
+                self.search_grid = None
+                self.current_image = None
+                postprocess = None
+                if self.theme == "dark":
+                    postprocess = lambda pix, zoom_level=self.zoom_level, rotation=self.current_rotation: apply_dark_mode(page, pix, zoom_level, rotation, smart=self.smart_dark_mode)
+                self.displayed_page = None
+                self.tile_view.show(page, zoom_matrix, key, postprocess)
+                return
+            img = self.render_cache.get(key)
+            if img is not None:
+                self.render_scheduler.cancel()
+                self.displayed_page = ((self.current_page, self.zoom_level, self.current_rotation, self.page_theme()), img)
+                self.show_page_image(img)
+            else:
+                self.show_zoom_preview()
+                self.render_scheduler.submit(self.current_file_path, self.current_page, self.zoom_level, self.current_rotation, self.page_theme())
+    def on_page_rendered(self, state, img, timing):
+        file_path, page_num, zoom_level, rotation, theme = state
+        if file_path != self.current_file_path:
+            return
+        print(f"Page {page_num + 1}: render {timing['render_ms']:.1f} ms, dark mode {timing['dark_mode_ms']:.1f} ms, total {timing['total_ms']:.1f} ms")
+        self.render_cache.put((page_num, round(zoom_level, 4), rotation, theme), img)
+        if (page_num, zoom_level, rotation, theme) == (self.current_page, self.zoom_level, self.current_rotation, self.page_theme()):
+            self.displayed_page = (state[1:], img)
+            self.show_page_image(img)
+    def show_zoom_preview(self):
+        """Rescale the last sharp bitmap of this page to the new zoom until the real render arrives"""
+        if not self.displayed_page:
+            return
+        (page_num, zoom_level, rotation, theme), img = self.displayed_page
+        if (page_num, rotation, theme) != (self.current_page, self.current_rotation, self.page_theme()) or zoom_level == self.zoom_level:
+            return
+        scale = self.zoom_level / zoom_level
+        self.show_page_image(img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale)))))
+    def show_page_image(self, img):
+        self.tile_view.clear()
+        self.canvas.delete("all")
+        self.search_boxes = []
+        self.search_grid = None
+        self.current_image = img.photo()
+        self.canvas.config(scrollregion=(0, 0, img.width, img.height))
+        self.canvas.create_image(0, 0, anchor="nw", image=self.current_image)
     def search_text(self):
         if not self.current_file:
             return  
@@ -197,13 +380,17 @@ class EbookReader:
             return
         self.canvas.delete("highlight")
         self.search_boxes = []
+        self.search_grid = None
         page = self.current_file[self.current_page]
         text_instances = page.search_for(search_term)
-        zoom_matrix = fitz.Matrix(self.zoom_level * 1.5, self.zoom_level * 1.5)
+        zoom_matrix = fitz.Matrix(self.zoom_level * 1.5, self.zoom_level * 1.5).prerotate(self.current_rotation)
+        origin = (page.rect * zoom_matrix).irect
         for inst in text_instances:
-            x0, y0, x1, y1 = [coord * self.zoom_level * 1.5 for coord in inst]
+            rect = inst * zoom_matrix
+            x0, y0, x1, y1 = rect.x0 - origin.x0, rect.y0 - origin.y0, rect.x1 - origin.x0, rect.y1 - origin.y0
             highlight = self.canvas.create_rectangle( x0, y0, x1, y1,fill="yellow", stipple="gray50", outline="",tags="highlight" )
             self.search_boxes.append({ "bbox": (x0, y0, x1, y1),"id": highlight })
+        self.search_grid = BoxGrid([box["bbox"] for box in self.search_boxes])
         self.search_index = -1
     def next_search_result(self):
         if self.search_boxes:
@@ -216,22 +403,31 @@ class EbookReader:
     def highlight_search_result(self):
         if self.search_boxes and 0 <= self.search_index < len(self.search_boxes):
             box = self.search_boxes[self.search_index]
-            self.canvas.yview_moveto(box["bbox"][1] / self.canvas.bbox("all")[3])
+            scroll_height = float(self.canvas.cget("scrollregion").split()[3])
+            self.canvas.yview_moveto(box["bbox"][1] / scroll_height)
             self.canvas.itemconfig(box["id"], outline="blue", width=2)
             if self.current_highlight and self.current_highlight != box["id"]:
                 self.canvas.itemconfig(self.current_highlight, outline="")
             self.current_highlight = box["id"]    
     def check_highlight_hover(self, event):
-        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
-        for box in self.search_boxes:
-            x0, y0, x1, y1 = box["bbox"]
-            if x0 <= x <= x1 and y0 <= y <= y1:
-                if self.current_highlight != box["id"]:
-                    if self.current_highlight:
-                        self.canvas.itemconfig(self.current_highlight, outline="")
-                    self.canvas.itemconfig(box["id"], outline="red", width=2)
-                    self.current_highlight = box["id"]
-                return
+        """Coalesce motion events so hit-testing runs at most once per hover_interval ms"""
+        self.hover_position = (event.x, event.y)
+        if self.hover_after_id is None and self.search_grid is not None:
+            self.hover_after_id = self.window.after(self.hover_interval, self.update_highlight_hover)
+    def update_highlight_hover(self):
+        self.hover_after_id = None
+        if self.search_grid is None:
+            return
+        x, y = self.canvas.canvasx(self.hover_position[0]), self.canvas.canvasy(self.hover_position[1])
+        index = self.search_grid.hit(x, y)
+        if index is not None:
+            box = self.search_boxes[index]
+            if self.current_highlight != box["id"]:
+                if self.current_highlight:
+                    self.canvas.itemconfig(self.current_highlight, outline="")
+                self.canvas.itemconfig(box["id"], outline="red", width=2)
+                self.current_highlight = box["id"]
+            return
         if self.current_highlight:
             self.canvas.itemconfig(self.current_highlight, outline="")
             self.current_highlight = None
@@ -284,30 +480,53 @@ class EbookReader:
             return
         file_types = [("PNG Image", "*.png"),("JPEG Image", "*.jpg"),("PDF files", "*.pdf"),("Text files", "*.txt"), ("Word files", "*.docx") ]
         save_path = filedialog.asksaveasfilename(filetypes=file_types, defaultextension=".pdf")
-        if save_path:
-            ext = os.path.splitext(save_path)[1].lower()
-            page = self.current_file[self.current_page]
-            text = page.get_text()
-            if ext == ".txt":
-                with open(save_path, "w", encoding="utf-8") as f:
-                    f.write(text)
-            elif ext == ".docx":
-                doc = Document()
-                doc.add_paragraph(text)
-                doc.save(save_path)
-            elif ext == '.pdf':
-                output_pdf = fitz.open()
-                output_pdf.insert_pdf(self.current_file, from_page=self.current_page, to_page=self.current_page)
-                output_pdf.save(save_path)
-                output_pdf.close()
-            elif ext in ['.png', '.jpg']:
-                pil_image = Image.frombytes(
-                    "RGB",
-                    [self.original_page_pixmap.width, self.original_page_pixmap.height],
-                    self.original_page_pixmap.samples
-                )
-                pil_image.save(save_path)
+        if not save_path:
+            return
+        ext = os.path.splitext(save_path)[1].lower()
+        if ext not in (".png", ".jpg", ".pdf", ".txt", ".docx"):
+            messagebox.showerror("Error", f"Unsupported export format: {ext}")
+            return
+        spec = ctk.CTkInputDialog(text=f"Pages to export (1-{self.total_pages}), e.g. 1-50,75,100-\nLeave empty for the current page:", title="Export Pages").get_input()
+        if spec is None:
+            return
+        dpi = 150
+        try:
+            pages = parse_page_ranges(spec or str(self.current_page + 1), self.total_pages)
+            if ext in (".png", ".jpg"):
+                dpi = int(ctk.CTkInputDialog(text="Image resolution in DPI (default 150):", title="Export Pages").get_input() or dpi)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        if pages:
+            self.start_export(pages, save_path, dpi)
+    def start_export(self, pages, save_path, dpi):
+        """Export in the background behind a progress dialog that can cancel it"""
+        dialog = ctk.CTkToplevel(self.window)
+        dialog.title("Exporting")
+        dialog.transient(self.window)
+        label = ctk.CTkLabel(dialog, text=f"Exporting {len(pages)} pages to {os.path.basename(save_path)}")
+        label.pack(padx=20, pady=(20, 10))
+        progress_bar = ctk.CTkProgressBar(dialog, width=300)
+        progress_bar.set(0)
+        progress_bar.pack(padx=20, pady=5)
+        def on_progress(done, total):
+            if dialog.winfo_exists():
+                progress_bar.set(done / total)
+                label.configure(text=f"Exported {done} of {total} pages")
+        def on_done(done, total, error):
+            if dialog.winfo_exists():
+                dialog.destroy()
+            if error:
+                messagebox.showerror("Error", f"Export failed: {error}")
+            elif done < total:
+                messagebox.showinfo("Export", f"Export cancelled after {done} of {total} pages")
+            else:
+                messagebox.showinfo("Export", f"Exported {total} pages to {save_path}")
+        job = ExportJob(self.window, self.current_file_path, pages, save_path, dpi, on_progress, on_done)
+        ctk.CTkButton(dialog, text="Cancel", command=job.cancel).pack(pady=(10, 20))
+        dialog.protocol("WM_DELETE_WINDOW", job.cancel)
     def handle_mousewheel(self, event):
+        """Scroll, or zoom with Ctrl held; "break" keeps the window's Ctrl+wheel binding from zooming again"""
         if event.state & 4:
             if event.delta > 0:
                 self.zoom_in()
@@ -315,6 +534,7 @@ class EbookReader:
                 self.zoom_out()
         else:
             self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")        
+        return "break"
     def setup_key_bindings(self):
         self.window.bind("<Control-o>", lambda e: self.open_file())
         self.window.bind("<Control-s>", lambda e: self.save_as())
@@ -408,7 +628,7 @@ class EbookReader:
         
     def show_view_menu(self):
         menu = ctk.CTkFrame(self.window)
-        menu_items = [  ("Zoom In", self.zoom_in), ("Zoom Out", self.zoom_out), ("Rotate Right", lambda: self.rotate_page(90)), ("Rotate Left", lambda: self.rotate_page(-90))]
+        menu_items = [  ("Zoom In", self.zoom_in), ("Zoom Out", self.zoom_out), ("Rotate Right", lambda: self.rotate_page(90)), ("Rotate Left", lambda: self.rotate_page(-90)), ("Smart Dark Mode", self.toggle_smart_dark_mode)]
         self.create_dropdown_menu(menu, menu_items)
     def show_bookmarks_menu(self):
         menu = ctk.CTkFrame(self.window)
@@ -448,9 +668,12 @@ class EbookReader:
         self.search_entry.delete(0, 'end')
         self.canvas.delete("highlight")
         self.search_boxes = []
+        self.search_grid = None
         self.search_index = -1      
     def run(self):
         self.window.mainloop()
+        self.render_scheduler.stop()
+        self.writer.close()
 if __name__ == "__main__":
     try:
         ctypes.windll.shcore.SetProcessDpiAwareness(1)